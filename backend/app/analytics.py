@@ -0,0 +1,325 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Literal, NamedTuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import rollup
+from .models import ABTest, Creative, Performance
+from .watermark import Watermark
+
+# Per-user columnar snapshot for cross-product reporting. Counters live in
+# (test, creative) x day int64 matrices; reports slice, mask and bincount
+# them in process memory. Like the bandit arm state, performance rows are
+# folded in incrementally off the request path: settled matrices plus a
+# re-read window of recent ids (see watermark.py).
+#
+# Each snapshot keeps at most the newest ANALYTICS_MAX_DAYS days, and fewer
+# once rows x days passes ANALYTICS_MAX_CELLS; reports over older dates see
+# only what is retained (describe() gives first_day).
+
+Metric = Literal["ctr", "cvr", "impression_to_conversion", "impressions", "clicks", "conversions"]
+GroupBy = Literal["creative", "product", "test"]
+REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "30"))
+MAX_USERS = int(os.getenv("ANALYTICS_MAX_USERS", "1000"))
+MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "400"))
+MAX_CELLS = int(os.getenv("ANALYTICS_MAX_CELLS", "2000000"))  # per counter matrix; 3 x 8 bytes each
+
+
+class Columns(NamedTuple):
+    """Immutable state; refresh() builds a new one and swaps it in whole."""
+
+    row_test: np.ndarray      # (rows,) test id of each (test, creative) row
+    row_creative: np.ndarray  # (rows,) creative id
+    row_product: np.ndarray   # (rows,) product of the creative
+    day0: date                # date of column 0
+    impressions: np.ndarray   # (rows, days)
+    clicks: np.ndarray
+    conversions: np.ndarray
+
+
+def _empty():
+    ids = np.zeros(0, dtype=np.int64)
+    counters = np.zeros((0, 0), dtype=np.int64)
+    return Columns(ids, ids, ids, date.today(), counters, counters, counters)
+
+
+def _ratio(num, den):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / den, 0.0)
+
+
+def _metric(metric, impressions, clicks, conversions):
+    if metric == "ctr":
+        return _ratio(clicks, impressions)
+    if metric == "cvr":
+        return _ratio(conversions, clicks)
+    if metric == "impression_to_conversion":
+        return _ratio(conversions, impressions)
+    return {"impressions": impressions, "clicks": clicks, "conversions": conversions}[metric].astype(np.float64)
+
+
+def _merge(old: Columns, deltas, creatives) -> Columns:
+    # deltas: [(test_id, creative_id, day, impressions, clicks, conversions)]
+    if not deltas:
+        return old
+    index = {(t, c): i for i, (t, c) in enumerate(zip(old.row_test.tolist(), old.row_creative.tolist()))}
+    pairs = list(zip(old.row_test.tolist(), old.row_creative.tolist()))
+    for test_id, creative_id, *_ in deltas:
+        if (test_id, creative_id) not in index:
+            index[(test_id, creative_id)] = len(pairs)
+            pairs.append((test_id, creative_id))
+    days = [d for _, _, d, *_ in deltas]
+    has_old = old.impressions.shape[1] > 0
+    first = min(days + ([old.day0] if has_old else []))
+    last = max(days + ([old.day0 + timedelta(days=old.impressions.shape[1] - 1)] if has_old else []))
+    shape = (len(pairs), (last - first).days + 1)
+    offset = (old.day0 - first).days if has_old else 0
+    rows = np.fromiter((index[(t, c)] for t, c, *_ in deltas), dtype=np.int64, count=len(deltas))
+    cols = np.fromiter(((d - first).days for _, _, d, *_ in deltas), dtype=np.int64, count=len(deltas))
+    counters = []
+    for k, current in enumerate((old.impressions, old.clicks, old.conversions)):
+        grown = np.zeros(shape, dtype=np.int64)
+        grown[: current.shape[0], offset: offset + current.shape[1]] = current
+        np.add.at(grown, (rows, cols), np.fromiter((d[3 + k] for d in deltas), dtype=np.int64, count=len(deltas)))
+        counters.append(grown)
+    tests = np.array([t for t, _ in pairs], dtype=np.int64)
+    creative_ids = np.array([c for _, c in pairs], dtype=np.int64)
+    products = np.array([creatives.get(c, (-1, None))[0] for c in creative_ids.tolist()], dtype=np.int64)
+    return Columns(tests, creative_ids, products, first, *counters)
+
+
+def _trim(columns: Columns) -> Columns:
+    # Keep the newest MAX_DAYS days, fewer if rows x days would exceed
+    # MAX_CELLS, and drop rows with nothing left in that range.
+    rows, days = columns.impressions.shape
+    keep = min(days, MAX_DAYS, max(1, MAX_CELLS // max(rows, 1)))
+    if keep == days:
+        return columns
+    window = slice(days - keep, days)
+    counters = [m[:, window] for m in (columns.impressions, columns.clicks, columns.conversions)]
+    live = (counters[0] + counters[1] + counters[2]).any(axis=1)
+    return Columns(
+        columns.row_test[live], columns.row_creative[live], columns.row_product[live],
+        columns.day0 + timedelta(days=days - keep), *(np.ascontiguousarray(m[live]) for m in counters),
+    )
+
+
+class UserSnapshot:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.columns = _empty()
+        self.settled = self.columns  # rows with id <= watermark.settled_id
+        self.creatives = {}  # id -> (product_id, headline)
+        self.watermark = Watermark()
+        self.refreshed_at = 0.0
+        self.refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def last_performance_id(self):
+        return self.watermark.high_id
+
+    # -- incremental load --------------------------------------------------
+
+    def _deltas(self, db: Session, *conditions):
+        # Per (test, creative, day) counter sums, plus the highest id, for the user's rows matching conditions.
+        day = rollup.bucket_expr(db, "day", Performance.timestamp)
+        rows = (
+            db.query(
+                Performance.test_id,
+                Performance.variant_id,
+                day,
+                func.coalesce(func.sum(Performance.impressions), 0),
+                func.coalesce(func.sum(Performance.clicks), 0),
+                func.coalesce(func.sum(Performance.conversions), 0),
+                func.max(Performance.id),
+            )
+            .filter(
+                # Driven by the user's tests so (test_id, user_id, id) serves the id range.
+                Performance.test_id.in_(db.query(ABTest.id).filter(ABTest.user_id == self.user_id).scalar_subquery()),
+                Performance.user_id == self.user_id,
+                *conditions,
+            )
+            .group_by(Performance.test_id, Performance.variant_id, day)
+            .all()
+        )
+        deltas = [
+            (t, c, (datetime.fromisoformat(d) if isinstance(d, str) else d).date(), int(i), int(k), int(v))
+            for t, c, d, i, k, v, _ in rows
+        ]
+        unknown = {c for _, c, *_ in deltas} - self.creatives.keys()
+        if unknown:
+            for cid, product_id, headline in db.query(Creative.id, Creative.product_id, Creative.headline).filter(
+                Creative.id.in_(unknown)
+            ):
+                self.creatives[cid] = (product_id, headline)
+        return deltas, max((high for *_, high in rows), default=0)
+
+    def refresh(self, db: Session):
+        """Settle old rows, re-read the recent window and rebuild the matrices."""
+        with self._lock:
+            watermark = self.watermark
+            settle_to = watermark.settle()
+            if settle_to > watermark.settled_id:
+                deltas, _ = self._deltas(db, Performance.id > watermark.settled_id, Performance.id <= settle_to)
+                self.settled = _trim(_merge(self.settled, deltas, self.creatives))
+                watermark.settled_id = settle_to
+            window, high = self._deltas(db, Performance.id > watermark.settled_id)
+            self.columns = _trim(_merge(self.settled, window, self.creatives))
+            watermark.seen(high)
+            self.refreshed_at = time.monotonic()
+        return self
+
+    # -- vectorised queries ------------------------------------------------
+
+    def _window(self, columns: Columns, start: date = None, end: date = None):
+        # Column slice for [start, end); both optional.
+        n = columns.impressions.shape[1]
+        lo = 0 if start is None else min(max((start - columns.day0).days, 0), n)
+        hi = n if end is None else min(max((end - columns.day0).days, 0), n)
+        return slice(lo, max(lo, hi))
+
+    def _mask(self, columns: Columns, product_ids=None, test_ids=None, creative_ids=None):
+        mask = np.ones(len(columns.row_test), dtype=bool)
+        if product_ids:
+            mask &= np.isin(columns.row_product, product_ids)
+        if test_ids:
+            mask &= np.isin(columns.row_test, test_ids)
+        if creative_ids:
+            mask &= np.isin(columns.row_creative, creative_ids)
+        return mask
+
+    def _totals(self, columns: Columns, keys, mask, window):
+        groups, inverse = np.unique(keys[mask], return_inverse=True)
+        sums = [
+            np.bincount(inverse, weights=m[mask, window].sum(axis=1), minlength=len(groups)).astype(np.int64)
+            for m in (columns.impressions, columns.clicks, columns.conversions)
+        ]
+        return groups, sums
+
+    def rank(self, metric: Metric = "ctr", group_by: GroupBy = "creative", product_ids=None, test_ids=None,
+             start: date = None, end: date = None, min_impressions: int = 0, descending: bool = True, limit: int = 50):
+        columns = self.columns
+        keys = {"creative": columns.row_creative, "product": columns.row_product, "test": columns.row_test}[group_by]
+        mask = self._mask(columns, product_ids, test_ids)
+        groups, (impressions, clicks, conversions) = self._totals(columns, keys, mask, self._window(columns, start, end))
+        keep = impressions >= min_impressions
+        groups, impressions, clicks, conversions = groups[keep], impressions[keep], clicks[keep], conversions[keep]
+        scores = _metric(metric, impressions, clicks, conversions)
+        order = np.lexsort((groups, -scores if descending else scores))[:limit]
+        ctr, cvr, itc = _ratio(clicks, impressions), _ratio(conversions, clicks), _ratio(conversions, impressions)
+        results = []
+        for rank, i in enumerate(order.tolist(), start=1):
+            item = {
+                "rank": rank,
+                f"{group_by}_id": int(groups[i]),
+                "impressions": int(impressions[i]),
+                "clicks": int(clicks[i]),
+                "conversions": int(conversions[i]),
+                "ctr": round(float(ctr[i]), 4),
+                "cvr": round(float(cvr[i]), 4),
+                "impression_to_conversion": round(float(itc[i]), 4),
+            }
+            if group_by == "creative":
+                product_id, headline = self.creatives.get(int(groups[i]), (None, None))
+                item.update(product_id=product_id, headline=headline)
+            results.append(item)
+        return results
+
+    def compare(self, creative_ids, metric: Literal["ctr", "cvr"] = "ctr", start: date = None, end: date = None,
+                daily: bool = False):
+        from . import stats
+
+        columns = self.columns
+        window = self._window(columns, start, end)
+        mask = self._mask(columns, creative_ids=creative_ids)
+        groups, (impressions, clicks, conversions) = self._totals(columns, columns.row_creative, mask, window)
+        position = {int(g): i for i, g in enumerate(groups)}
+        pick = lambda values: np.array([values[position[c]] if c in position else 0 for c in creative_ids], dtype=np.int64)
+        impressions, clicks, conversions = pick(impressions), pick(clicks), pick(conversions)
+        successes, trials = (clicks, impressions) if metric == "ctr" else (conversions, clicks)
+        rates = _ratio(successes, trials)
+        z, p = stats.z_tests(successes, trials, reference=0)
+        z = -z  # positive when the creative beats the baseline, like lift
+        results = []
+        for i, creative_id in enumerate(creative_ids):
+            product_id, headline = self.creatives.get(creative_id, (None, None))
+            item = {
+                "creative_id": creative_id,
+                "product_id": product_id,
+                "headline": headline,
+                "impressions": int(impressions[i]),
+                "clicks": int(clicks[i]),
+                "conversions": int(conversions[i]),
+                metric: round(float(rates[i]), 4),
+                "lift": round(float(rates[i] / rates[0] - 1), 4) if i and rates[0] > 0 else None,
+                "z_score": round(float(z[i]), 4) if i else None,
+                "p_value": round(float(p[i]), 4) if i else None,
+            }
+            if daily:
+                rows = mask & (columns.row_creative == creative_id)
+                per_day = [m[rows, window].sum(axis=0) for m in (columns.impressions, columns.clicks, columns.conversions)]
+                item["daily"] = [
+                    {"day": columns.day0 + timedelta(days=window.start + d), "impressions": int(per_day[0][d]),
+                     "clicks": int(per_day[1][d]), "conversions": int(per_day[2][d])}
+                    for d in np.flatnonzero(per_day[0] + per_day[1] + per_day[2]).tolist()
+                ]
+            results.append(item)
+        return results
+
+    def describe(self):
+        columns = self.columns
+        return {
+            "rows": int(columns.impressions.shape[0]),
+            "days": int(columns.impressions.shape[1]),
+            "first_day": columns.day0 if columns.impressions.shape[1] else None,
+            "last_performance_id": self.last_performance_id,
+            "settled_performance_id": self.watermark.settled_id,
+            "age_seconds": round(time.monotonic() - self.refreshed_at, 3),
+        }
+
+
+_snapshots = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_snapshot(user_id: int):
+    with _registry_lock:
+        snapshot = _snapshots.get(user_id)
+        if snapshot is not None:
+            _snapshots.move_to_end(user_id)
+        return snapshot
+
+
+def is_stale(snapshot: UserSnapshot):
+    return time.monotonic() - snapshot.refreshed_at > REFRESH_SECONDS
+
+
+def load(db: Session, user_id: int):
+    """Cold path: build the user's snapshot from every performance row."""
+    snapshot = UserSnapshot(user_id).refresh(db)
+    with _registry_lock:
+        _snapshots[user_id] = snapshot
+        while len(_snapshots) > MAX_USERS:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def refresh_in_background(user_id: int):
+    from .db import SessionLocal
+
+    snapshot = get_snapshot(user_id)
+    if snapshot is None:
+        return
+    db = SessionLocal()
+    try:
+        snapshot.refresh(db)
+    finally:
+        snapshot.refreshing = False
+        db.close()
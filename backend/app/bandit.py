@@ -0,0 +1,193 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Literal, get_args
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import ABTest, ABTestVariant, Performance
+from .watermark import Watermark
+
+# In-memory arm state for traffic allocation on running tests. choose() only
+# touches process memory; counters are pulled from the performance table
+# incrementally (settled totals plus a re-read window, see watermark.py) off
+# the request path.
+
+Policy = Literal["thompson", "ucb", "epsilon"]
+Reward = Literal["clicks", "conversions"]
+POLICIES = get_args(Policy)
+REFRESH_SECONDS = float(os.getenv("BANDIT_REFRESH_SECONDS", "5"))
+MAX_TESTS = int(os.getenv("BANDIT_MAX_TESTS", "10000"))
+
+
+class TestArms:
+    def __init__(self, test_id: int, user_id: int, variant_ids):
+        self.test_id = test_id
+        self.user_id = user_id
+        self.variant_ids = np.asarray(variant_ids, dtype=np.int64)
+        k = len(variant_ids)
+        self.impressions = np.zeros(k)
+        self.clicks = np.zeros(k)
+        self.conversions = np.zeros(k)
+        self.settled = np.zeros((3, k))  # counters for ids <= watermark.settled_id
+        self.watermark = Watermark()
+        self.refreshed_at = 0.0
+        self.refreshing = False
+        self._index = {vid: i for i, vid in enumerate(variant_ids)}
+        self._lock = threading.Lock()
+
+    def observe(self, variant_id: int, impressions=0, clicks=0, conversions=0):
+        i = self._index.get(variant_id)
+        if i is None:
+            return
+        with self._lock:
+            self.settled[:, i] += (impressions, clicks, conversions)
+            self.impressions[i] += impressions
+            self.clicks[i] += clicks
+            self.conversions[i] += conversions
+
+    @property
+    def last_performance_id(self):
+        return self.watermark.high_id
+
+    def choose(self, policy="thompson", reward="clicks", epsilon=0.1, rng=None):
+        rng = rng if rng is not None else _rng
+        successes = self.clicks if reward == "clicks" else self.conversions
+        trials = self.impressions if reward == "clicks" else self.clicks
+        if policy == "thompson":
+            failures = np.maximum(trials - successes, 0)
+            scores = rng.beta(successes + 1, failures + 1)
+        elif policy == "ucb":
+            untried = np.flatnonzero(trials == 0)
+            if len(untried):
+                return int(self.variant_ids[untried[0]])
+            scores = successes / trials + np.sqrt(2 * math.log(trials.sum()) / trials)
+        elif policy == "epsilon":
+            if rng.random() < epsilon:
+                return int(self.variant_ids[rng.integers(len(self.variant_ids))])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(trials > 0, successes / trials, np.inf)
+        else:
+            raise ValueError(f"unknown policy {policy!r}")
+        return int(self.variant_ids[int(np.argmax(scores))])
+
+    def snapshot(self):
+        return [
+            {
+                "variant_id": int(vid),
+                "impressions": int(self.impressions[i]),
+                "clicks": int(self.clicks[i]),
+                "conversions": int(self.conversions[i]),
+            }
+            for i, vid in enumerate(self.variant_ids)
+        ]
+
+
+_rng = np.random.default_rng()
+_arms = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_arms(test_id: int, user_id: int):
+    with _registry_lock:
+        arms = _arms.get(test_id)
+        if arms is None or arms.user_id != user_id:
+            return None
+        _arms.move_to_end(test_id)
+        return arms
+
+
+def is_stale(arms: TestArms):
+    return time.monotonic() - arms.refreshed_at > REFRESH_SECONDS
+
+
+def _totals(db: Session, arms: TestArms, *conditions):
+    # Per-variant counter sums, plus the highest id, for rows matching conditions.
+    rows = (
+        db.query(
+            Performance.variant_id,
+            func.sum(Performance.impressions),
+            func.sum(Performance.clicks),
+            func.sum(Performance.conversions),
+            func.max(Performance.id),
+        )
+        .filter(Performance.test_id == arms.test_id, Performance.user_id == arms.user_id, *conditions)
+        .group_by(Performance.variant_id)
+        .all()
+    )
+    totals = np.zeros((3, len(arms.variant_ids)))
+    high = 0
+    for variant_id, impressions, clicks, conversions, max_id in rows:
+        high = max(high, max_id)
+        i = arms._index.get(variant_id)
+        if i is not None:
+            totals[:, i] = (impressions or 0, clicks or 0, conversions or 0)
+    return totals, high
+
+
+def refresh(db: Session, arms: TestArms):
+    """Settle old rows, re-read the recent window and recompute the arm counters."""
+    watermark = arms.watermark
+    settle_to = watermark.settle()
+    if settle_to > watermark.settled_id:
+        settled, _ = _totals(db, arms, Performance.id > watermark.settled_id, Performance.id <= settle_to)
+        with arms._lock:
+            arms.settled += settled
+        watermark.settled_id = settle_to
+    window, high = _totals(db, arms, Performance.id > watermark.settled_id)
+    with arms._lock:
+        arms.impressions, arms.clicks, arms.conversions = arms.settled + window
+    watermark.seen(high)
+    arms.refreshed_at = time.monotonic()
+    return arms
+
+
+def load(db: Session, test_id: int, user_id: int):
+    """Cold path: build arm state for a running test the user owns, or None."""
+    test = db.query(ABTest).filter(ABTest.id == test_id, ABTest.user_id == user_id).first()
+    if test is None or test.status != "running":
+        return None
+    variant_ids = [
+        vid for (vid,) in db.query(ABTestVariant.creative_id)
+        .filter(ABTestVariant.test_id == test_id)
+        .order_by(ABTestVariant.position)
+    ]
+    if not variant_ids:
+        return None
+    arms = refresh(db, TestArms(test_id, user_id, variant_ids))
+    with _registry_lock:
+        _arms[test_id] = arms
+        _arms.move_to_end(test_id)
+        while len(_arms) > MAX_TESTS:
+            _arms.popitem(last=False)
+    return arms
+
+
+def refresh_in_background(test_id: int):
+    from .db import SessionLocal
+
+    with _registry_lock:
+        arms = _arms.get(test_id)
+    if arms is None:
+        return
+    db = SessionLocal()
+    try:
+        # Tests are stopped or deleted outside this API (there are no such
+        # routes), so the refresh notices and drops state it no longer needs.
+        status = db.query(ABTest.status).filter(ABTest.id == test_id, ABTest.user_id == arms.user_id).scalar()
+        if status != "running":
+            forget(test_id)
+            return
+        refresh(db, arms)
+    finally:
+        arms.refreshing = False
+        db.close()
+
+
+def forget(test_id: int):
+    with _registry_lock:
+        _arms.pop(test_id, None)
@@ -1,10 +1,14 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
+import csv
+import io
+import math
+import random
+from typing import List
+from sqlalchemy import and_, func, insert
+from sqlalchemy.orm import Session, load_only, selectinload
+from . import models, response_cache, rollup, schemas, stats
 from datetime import datetime
-from .models import Creative, Performance
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .models import Creative, Performance, PerformanceRollup
+from .passwords import pwd_context
 
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -12,16 +16,37 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# Listing helpers
+
+def _keyset_page(query, model, limit: int = None, after: int = None, fields: List[str] = None):
+    # Stable id order with an id cursor; with fields, only those columns load.
+    if fields:
+        columns = [getattr(model, f) for f in fields if f in model.__table__.columns]
+        query = query.options(load_only(*columns))
+    if after is not None:
+        query = query.filter(model.id > after)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def _project(obj, fields: List[str], **derived):
+    return {f: derived[f](obj) if f in derived else getattr(obj, f) for f in fields}
+
 # User
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    hashed_password = hashed_password or get_password_hash(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
@@ -57,8 +82,11 @@ def get_product(db: Session, product_id: int, user_id: int):
         user_id=db_product.user_id
     )
 
-def get_products(db: Session, user_id: int):
-    products = db.query(models.Product).filter(models.Product.user_id == user_id).all()
+def get_products(db: Session, user_id: int, limit: int = None, after: int = None, fields: List[str] = None):
+    query = db.query(models.Product).filter(models.Product.user_id == user_id)
+    products = _keyset_page(query, models.Product, limit, after, fields)
+    if fields:
+        return [_project(p, fields, images=lambda p: p.images.split(",")) for p in products]
     return [
         schemas.ProductOut(
             id=p.id,
@@ -78,120 +106,475 @@ def create_creative(db: Session, creative: schemas.CreativeCreate, user_id: int)
     db_creative = models.Creative(**data)
     db.add(db_creative)
     db.commit()
+    response_cache.invalidate(product_ids=[db_creative.product_id])  # metrics list every creative of the product
     db.refresh(db_creative)
     return db_creative
 
-def get_creatives_by_product(db: Session, product_id: int, user_id: int):
-    return db.query(models.Creative).filter(models.Creative.product_id == product_id, models.Creative.user_id == user_id).all()
+def get_creatives_by_product(db: Session, product_id: int, user_id: int, limit: int = None, after: int = None,
+                             fields: List[str] = None):
+    query = db.query(models.Creative).filter(models.Creative.product_id == product_id, models.Creative.user_id == user_id)
+    creatives = _keyset_page(query, models.Creative, limit, after, fields)
+    return [_project(c, fields) for c in creatives] if fields else creatives
 
-def get_creatives(db: Session, user_id: int):
-    return db.query(models.Creative).filter(models.Creative.user_id == user_id).all()
+def get_creatives(db: Session, user_id: int, limit: int = None, after: int = None, fields: List[str] = None):
+    query = db.query(models.Creative).filter(models.Creative.user_id == user_id)
+    creatives = _keyset_page(query, models.Creative, limit, after, fields)
+    return [_project(c, fields) for c in creatives] if fields else creatives
 
 # AB Test
 
-def create_abtest(db: Session, test: schemas.ABTestCreate, user_id: int):
-    test_db = models.ABTest(
-        product_id=test.product_id,
-        variant_ids=','.join(map(str, test.variant_ids)),
-        user_id=user_id
-    )
-    db.add(test_db)
-    db.commit()
-    db.refresh(test_db)
-    variant_ids_list = list(map(int, test_db.variant_ids.split(','))) if test_db.variant_ids else []
+def _abtest_out(test_db: models.ABTest):
     return {
         "id": test_db.id,
         "product_id": test_db.product_id,
-        "variant_ids": variant_ids_list,
+        "variant_ids": test_db.variant_ids_list,
         "start_date": test_db.start_date,
         "end_date": test_db.end_date,
         "status": test_db.status,
         "user_id": test_db.user_id
     }
 
-def get_abtests(db: Session, user_id: int):
-    abtests = db.query(models.ABTest).filter(models.ABTest.user_id == user_id).all()
-    results = []
-    for test_db in abtests:
-        variant_ids_list = list(map(int, test_db.variant_ids.split(','))) if test_db.variant_ids else []
-        results.append({
-            "id": test_db.id,
-            "product_id": test_db.product_id,
-            "variant_ids": variant_ids_list,
-            "start_date": test_db.start_date,
-            "end_date": test_db.end_date,
-            "status": test_db.status,
-            "user_id": test_db.user_id
-        })
-    return results
+def create_abtest(db: Session, test: schemas.ABTestCreate, user_id: int):
+    test_db = models.ABTest(product_id=test.product_id, user_id=user_id)
+    # Order is preserved through position; repeated ids collapse to one variant.
+    for position, creative_id in enumerate(dict.fromkeys(test.variant_ids)):
+        test_db.variants.append(models.ABTestVariant(creative_id=creative_id, position=position))
+    db.add(test_db)
+    db.commit()
+    db.refresh(test_db)
+    return _abtest_out(test_db)
+
+# Batch creation: references are checked in one query, then every row goes
+# in with a single INSERT ... RETURNING inside one transaction.
+
+class InvalidReferences(Exception):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid item(s)")
+        self.errors = errors
+
+def _owned_product_ids(db: Session, product_ids, user_id: int):
+    return {
+        pid for (pid,) in db.query(models.Product.id)
+        .filter(models.Product.id.in_(set(product_ids)), models.Product.user_id == user_id)
+    }
+
+def _insert_returning(db: Session, model, rows):
+    # Column rows rather than ORM objects, so commit() has nothing to expire
+    # and reading them back costs no per-row refresh SELECT.
+    # sort_by_parameter_order keeps RETURNING rows aligned with the input, but
+    # SQLite can only honour it with one INSERT per row. There a batched
+    # INSERT assigns ids in parameter order (single writer), so sorting by id
+    # realigns them instead.
+    table = model.__table__
+    if db.get_bind().dialect.name == "sqlite":
+        return sorted(db.execute(insert(table).returning(*table.columns), rows).all(), key=lambda row: row.id)
+    return db.execute(insert(table).returning(*table.columns, sort_by_parameter_order=True), rows).all()
+
+def create_products(db: Session, products: List[schemas.ProductCreate], user_id: int):
+    if not products:
+        return []
+    rows = [
+        {"title": p.title, "description": p.description, "images": ",".join(p.images), "user_id": user_id}
+        for p in products
+    ]
+    created = _insert_returning(db, models.Product, rows)
+    db.commit()
+    return [
+        schemas.ProductOut(id=p.id, title=p.title, description=p.description, images=p.images.split(","), user_id=p.user_id)
+        for p in created
+    ]
+
+def create_creatives(db: Session, creatives: List[schemas.CreativeCreate], user_id: int):
+    if not creatives:
+        return []
+    owned = _owned_product_ids(db, [c.product_id for c in creatives], user_id)
+    errors = [
+        {"index": i, "error": f"Product {c.product_id} not found"}
+        for i, c in enumerate(creatives) if c.product_id not in owned
+    ]
+    if errors:
+        raise InvalidReferences(errors)
+    created = _insert_returning(db, models.Creative, [dict(c.dict(), user_id=user_id) for c in creatives])
+    db.commit()
+    response_cache.invalidate(product_ids=owned)
+    return [schemas.CreativeOut(**c._mapping) for c in created]
+
+def create_abtests(db: Session, tests: List[schemas.ABTestCreate], user_id: int):
+    if not tests:
+        return []
+    variant_ids = [list(dict.fromkeys(t.variant_ids)) for t in tests]
+    # Each owned product with whichever requested creatives belong to it (and to the user).
+    rows = (
+        db.query(models.Product.id, Creative.id)
+        .outerjoin(Creative, and_(
+            Creative.product_id == models.Product.id,
+            Creative.user_id == user_id,
+            Creative.id.in_({v for ids in variant_ids for v in ids}),
+        ))
+        .filter(models.Product.id.in_({t.product_id for t in tests}), models.Product.user_id == user_id)
+        .all()
+    )
+    creatives_of = {}
+    for product_id, creative_id in rows:
+        creatives_of.setdefault(product_id, set()).add(creative_id)
+    errors = []
+    for i, (test, ids) in enumerate(zip(tests, variant_ids)):
+        if test.product_id not in creatives_of:
+            errors.append({"index": i, "error": f"Product {test.product_id} not found"})
+            continue
+        missing = [v for v in ids if v not in creatives_of[test.product_id]]
+        if missing:
+            errors.append({"index": i, "error": f"Creatives {missing} not found for product {test.product_id}"})
+    if errors:
+        raise InvalidReferences(errors)
+    created = _insert_returning(db, models.ABTest, [{"product_id": t.product_id, "user_id": user_id} for t in tests])
+    variant_rows = [
+        {"test_id": test.id, "creative_id": creative_id, "position": position}
+        for test, ids in zip(created, variant_ids)
+        for position, creative_id in enumerate(ids)
+    ]
+    if variant_rows:
+        db.execute(insert(models.ABTestVariant.__table__), variant_rows)
+    db.commit()
+    return [
+        {
+            "id": t.id,
+            "product_id": t.product_id,
+            "variant_ids": ids,
+            "start_date": t.start_date,
+            "end_date": t.end_date,
+            "status": t.status,
+            "user_id": t.user_id,
+        }
+        for t, ids in zip(created, variant_ids)
+    ]
+
+def _abtest_page(query, limit=None, after=None, fields=None):
+    if not fields or "variant_ids" in fields:
+        query = query.options(selectinload(models.ABTest.variants))
+    abtests = _keyset_page(query, models.ABTest, limit, after, fields)
+    if fields:
+        return [_project(t, fields, variant_ids=lambda t: t.variant_ids_list) for t in abtests]
+    return [_abtest_out(test_db) for test_db in abtests]
+
+def get_abtests(db: Session, user_id: int, limit: int = None, after: int = None, fields: List[str] = None):
+    query = db.query(models.ABTest).filter(models.ABTest.user_id == user_id)
+    return _abtest_page(query, limit, after, fields)
+
+def get_abtests_by_creative(db: Session, creative_id: int, user_id: int, limit: int = None, after: int = None,
+                            fields: List[str] = None):
+    query = (
+        db.query(models.ABTest)
+        .join(models.ABTestVariant, models.ABTestVariant.test_id == models.ABTest.id)
+        .filter(models.ABTestVariant.creative_id == creative_id, models.ABTest.user_id == user_id)
+    )
+    return _abtest_page(query, limit, after, fields)
+
+def variants_by_test(db: Session, test_ids, user_id: int):
+    # {test_id: {creative ids}} for the given tests the user owns.
+    variants = {}
+    for test_id, creative_id in (
+        db.query(models.ABTestVariant.test_id, models.ABTestVariant.creative_id)
+        .join(models.ABTest, models.ABTest.id == models.ABTestVariant.test_id)
+        .filter(models.ABTest.id.in_(set(test_ids)), models.ABTest.user_id == user_id)
+    ):
+        variants.setdefault(test_id, set()).add(creative_id)
+    return variants
 
 def get_abtest_by_id(db: Session, abtest_id: int, user_id: int):
-    abtest_db = db.query(models.ABTest).filter(models.ABTest.id == abtest_id, models.ABTest.user_id == user_id).first()
+    abtest_db = (
+        db.query(models.ABTest)
+        .options(selectinload(models.ABTest.variants))
+        .filter(models.ABTest.id == abtest_id, models.ABTest.user_id == user_id)
+        .first()
+    )
     if not abtest_db:
         return None
-    variant_ids_list = list(map(int, abtest_db.variant_ids.split(','))) if abtest_db.variant_ids else []
-    return {
-        "id": abtest_db.id,
-        "product_id": abtest_db.product_id,
-        "variant_ids": variant_ids_list,
-        "start_date": abtest_db.start_date,
-        "end_date": abtest_db.end_date,
-        "status": abtest_db.status,
-        "user_id": abtest_db.user_id
-    }
+    return _abtest_out(abtest_db)
 
 def log_performance(db: Session, perf: schemas.PerformanceCreate, user_id: int):
     data = perf.dict()
     data['user_id'] = user_id  # Overwrite or set user_id
     record = models.Performance(**data)
     db.add(record)
+    db.flush()
+    rollup.apply(db, [record])
+    products = _written_products(db, [record.variant_id])
     db.commit()
+    response_cache.invalidate(test_ids=[record.test_id], product_ids=products)
     db.refresh(record)
     return record
 
-def get_performance_by_test(db: Session, test_id: int, user_id: int):
-    return db.query(models.Performance).filter(models.Performance.test_id == test_id, models.Performance.user_id == user_id).all()
+def _written_products(db: Session, variant_ids):
+    # Products whose cached metrics cover these variants; skipped when nothing is cached.
+    if not response_cache.backend.enabled:
+        return []
+    return [p for (p,) in db.query(Creative.product_id).filter(Creative.id.in_(set(variant_ids))).distinct()]
+
+PERFORMANCE_COLUMNS = ("test_id", "variant_id", "impressions", "clicks", "conversions", "timestamp", "user_id")
+
+def bulk_log_performance(db: Session, perfs: List[schemas.PerformanceCreate], user_id: int):
+    # One transaction per batch: COPY on psycopg2, multi-row INSERT elsewhere.
+    if not perfs:
+        return 0
+    now = datetime.now()
+    rows = []
+    for perf in perfs:
+        data = perf.dict()
+        data['user_id'] = user_id
+        data['timestamp'] = now
+        rows.append(data)
+    return insert_performance_rows(db, rows)
+
+def insert_performance_rows(db: Session, rows: List[dict]):
+    # rows carry every PERFORMANCE_COLUMNS key, timestamp included.
+    if not rows:
+        return 0
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+        _copy_performance(db, rows)
+    else:
+        db.execute(insert(models.Performance.__table__), rows)
+    rollup.apply(db, rows)
+    products = _written_products(db, [row["variant_id"] for row in rows])
+    db.commit()
+    response_cache.invalidate(test_ids=[row["test_id"] for row in rows], product_ids=products)
+    return len(rows)
+
+def _copy_performance(db: Session, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[c] for c in PERFORMANCE_COLUMNS])
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {models.Performance.__tablename__} ({', '.join(PERFORMANCE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+    finally:
+        cursor.close()
+
+def simulate_performance(db: Session, test_id: int, user_id: int):
+    test = db.query(models.ABTest).filter(models.ABTest.id == test_id, models.ABTest.user_id == user_id).first()
+    if not test:
+        return None
+    data = []
+    for vid in test.variant_ids_list:
+        impressions = random.randint(100, 1000)
+        clicks = random.randint(0, impressions)
+        conversions = random.randint(0, clicks)
+        record = schemas.PerformanceCreate(
+            test_id=test_id,
+            variant_id=vid,
+            impressions=impressions,
+            clicks=clicks,
+            conversions=conversions,
+        )
+        data.append(log_performance(db, record, user_id=user_id))
+    return data
+
+def get_performance_by_test(db: Session, test_id: int, user_id: int, limit: int = None, after: int = None,
+                            fields: List[str] = None):
+    query = db.query(models.Performance).filter(models.Performance.test_id == test_id, models.Performance.user_id == user_id)
+    rows = _keyset_page(query, models.Performance, limit, after, fields)
+    return [_project(r, fields) for r in rows] if fields else rows
+
+def _rollup_granularity(start: datetime = None, end: datetime = None):
+    # Coarsest rollup bucket that represents the window exactly, if any.
+    for granularity in ("day", "hour"):
+        if rollup.is_aligned(start, granularity) and rollup.is_aligned(end, granularity):
+            return granularity
+    return None
 
-def calculate_metrics(product_id: int, db: Session, user_id: int):
-    variants = db.query(Creative).filter(Creative.product_id == product_id, Creative.user_id == user_id).all()
+def calculate_metrics(product_id: int, db: Session, user_id: int, test_id: int = None,
+                      start: datetime = None, end: datetime = None):
+    # One GROUP BY over all variants of the product; filters live in the join
+    # condition so variants without matching rows still come back as zeros.
+    # Bucket-aligned windows read the rollup table, anything else raw rows.
+    granularity = _rollup_granularity(start, end)
+    if granularity:
+        src, ts = PerformanceRollup, PerformanceRollup.bucket_start
+        join_on = [src.variant_id == Creative.id, src.user_id == user_id, src.granularity == granularity]
+    else:
+        src, ts = Performance, Performance.timestamp
+        join_on = [src.variant_id == Creative.id, src.user_id == user_id]
+    if test_id is not None:
+        join_on.append(src.test_id == test_id)
+    if start is not None:
+        join_on.append(ts >= start)
+    if end is not None:
+        join_on.append(ts < end)
+    rows = (
+        db.query(
+            Creative.id,
+            func.coalesce(func.sum(src.impressions), 0),
+            func.coalesce(func.sum(src.clicks), 0),
+            func.coalesce(func.sum(src.conversions), 0),
+        )
+        .outerjoin(src, and_(*join_on))
+        .filter(Creative.product_id == product_id, Creative.user_id == user_id)
+        .group_by(Creative.id)
+        .order_by(Creative.id)
+        .all()
+    )
     result = []
-    for variant in variants:
-        performances = db.query(Performance).filter(Performance.variant_id == variant.id, Performance.user_id == user_id).all()
-        impressions = sum(p.impressions for p in performances)
-        clicks = sum(p.clicks for p in performances)
-        conversions = sum(p.conversions for p in performances)
+    for variant_id, impressions, clicks, conversions in rows:
         ctr = clicks / impressions if impressions else 0
         cvr = conversions / clicks if clicks else 0
         imp_to_conv = conversions / impressions if impressions else 0
         result.append({
-            "variant_id": variant.id,
+            "variant_id": variant_id,
             "ctr": round(ctr, 4),
             "cvr": round(cvr, 4),
             "impression_to_conversion": round(imp_to_conv, 4),
         })
     return result
 
+def _finite(value):
+    # mSPRT boundaries are infinite until an arm has data; JSON has no inf.
+    value = float(value)
+    return round(value, 4) if math.isfinite(value) else None
+
 def suggest_best_creative(db: Session, abtest_id: int, user_id: int):
-    abtest = db.query(models.ABTest).filter(models.ABTest.id == abtest_id, models.ABTest.user_id == user_id).first()
-    if not abtest:
+    # Creative fields and per-variant counters for the test in one aggregate.
+    R = PerformanceRollup
+    rows = (
+        db.query(
+            Creative.id,
+            Creative.headline,
+            Creative.description,
+            Creative.image_url,
+            func.coalesce(func.sum(R.impressions), 0),
+            func.coalesce(func.sum(R.clicks), 0),
+            func.coalesce(func.sum(R.conversions), 0),
+        )
+        .join(models.ABTestVariant, models.ABTestVariant.creative_id == Creative.id)
+        .join(models.ABTest, models.ABTest.id == models.ABTestVariant.test_id)
+        .outerjoin(R, and_(
+            R.variant_id == Creative.id, R.test_id == abtest_id, R.user_id == user_id, R.granularity == "day",
+        ))
+        .filter(models.ABTest.id == abtest_id, models.ABTest.user_id == user_id)
+        .group_by(Creative.id, Creative.headline, Creative.description, Creative.image_url, models.ABTestVariant.position)
+        .order_by(models.ABTestVariant.position)
+        .all()
+    )
+    if not rows:
         return None
-    variant_ids = abtest.variant_ids_list
-    best_cvr = -1
-    best_creative = None
-    for vid in variant_ids:
-        performances = db.query(models.Performance).filter(models.Performance.variant_id == vid, models.Performance.user_id == user_id).all()
-        clicks = sum(p.clicks for p in performances)
-        conversions = sum(p.conversions for p in performances)
-        cvr = conversions / clicks if clicks else 0
-        if cvr > best_cvr:
-            best_cvr = cvr
-            best_creative = db.query(models.Creative).filter(models.Creative.id == vid).first()
-    if best_creative:
-        return {
-            "id": best_creative.id,
-            "headline": best_creative.headline,
-            "description": best_creative.description,
-            "image_url": best_creative.image_url,
-            "cvr": round(best_cvr, 4)
-        }
-    return None
\ No newline at end of file
+    clicks = [r[5] for r in rows]
+    conversions = [r[6] for r in rows]
+    analysis = stats.analyze(conversions, clicks)
+    best = rows[analysis["leader"]]
+    best_cvr = conversions[analysis["leader"]] / clicks[analysis["leader"]] if clicks[analysis["leader"]] else 0
+    return {
+        "id": best[0],
+        "headline": best[1],
+        "description": best[2],
+        "image_url": best[3],
+        "cvr": round(best_cvr, 4),
+        "confidence": round(analysis["confidence"], 4),
+        "conclusive": analysis["conclusive"],
+        "variants": [
+            {
+                "variant_id": row[0],
+                "impressions": row[4],
+                "clicks": row[5],
+                "conversions": row[6],
+                "cvr": round(row[6] / row[5], 4) if row[5] else 0,
+                "win_probability": round(float(analysis["win_probability"][i]), 4),
+                "z_score": round(float(analysis["z_score"][i]), 4),
+                "p_value": round(float(analysis["p_value"][i]), 4),
+                "boundary_z": _finite(analysis["boundary_z"][i]) if i != analysis["leader"] else None,
+            }
+            for i, row in enumerate(rows)
+        ],
+    }
+
+BUCKET_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _timeseries_source(bucket: str, start: datetime = None, end: datetime = None):
+    # Coarsest rollup no coarser than the bucket that covers the window
+    # exactly; None means only raw rows can answer it.
+    for granularity in ("day", "hour"):
+        if BUCKET_SECONDS[granularity] <= BUCKET_SECONDS[bucket] \
+                and rollup.is_aligned(start, granularity) and rollup.is_aligned(end, granularity):
+            return granularity
+    return None
+
+def get_timeseries(db: Session, test_id: int, user_id: int, bucket: str = "day",
+                   start: datetime = None, end: datetime = None, max_points: int = None):
+    test = (
+        db.query(models.ABTest)
+        .options(selectinload(models.ABTest.variants))
+        .filter(models.ABTest.id == test_id, models.ABTest.user_id == user_id)
+        .first()
+    )
+    if not test:
+        return None
+    requested = bucket
+    if max_points:
+        # Downsample long ranges by moving to a coarser bucket rather than
+        # returning (and aggregating) thousands of points per variant.
+        first, last = start, end
+        if first is None or last is None:
+            lo, hi = (
+                db.query(func.min(PerformanceRollup.bucket_start), func.max(PerformanceRollup.bucket_start))
+                .filter(PerformanceRollup.user_id == user_id, PerformanceRollup.test_id == test_id,
+                        PerformanceRollup.granularity == "hour")
+                .one()
+            )
+            first, last = first or _as_datetime(lo), last or _as_datetime(hi)
+        if first is not None and last is not None:
+            span = (last - first).total_seconds()
+            while bucket != "week" and span / BUCKET_SECONDS[bucket] > max_points:
+                bucket = "day" if bucket == "hour" else "week"
+
+    granularity = _timeseries_source(bucket, start, end)
+    if granularity:
+        src, ts = PerformanceRollup, PerformanceRollup.bucket_start
+        filters = [src.user_id == user_id, src.test_id == test_id, src.granularity == granularity]
+        bucket_col = ts if granularity == bucket else rollup.bucket_expr(db, bucket, ts)
+    else:
+        src, ts = Performance, Performance.timestamp
+        filters = [src.test_id == test_id, src.user_id == user_id]
+        bucket_col = rollup.bucket_expr(db, bucket, ts)
+    if start is not None:
+        filters.append(ts >= start)
+    if end is not None:
+        filters.append(ts < end)
+    bucket_col = bucket_col.label("bucket_start")
+    rows = (
+        db.query(
+            src.variant_id,
+            bucket_col,
+            func.sum(src.impressions),
+            func.sum(src.clicks),
+            func.sum(src.conversions),
+        )
+        .filter(*filters)
+        .group_by(src.variant_id, bucket_col)
+        .order_by(src.variant_id, bucket_col)
+        .all()
+    )
+    points = {variant_id: [] for variant_id in test.variant_ids_list}
+    for variant_id, bucket_start, impressions, clicks, conversions in rows:
+        impressions, clicks, conversions = impressions or 0, clicks or 0, conversions or 0
+        points.setdefault(variant_id, []).append({
+            "bucket_start": _as_datetime(bucket_start),
+            "impressions": impressions,
+            "clicks": clicks,
+            "conversions": conversions,
+            "ctr": round(clicks / impressions, 4) if impressions else 0,
+            "cvr": round(conversions / clicks, 4) if clicks else 0,
+        })
+    return {
+        "test_id": test_id,
+        "bucket": bucket,
+        "requested_bucket": requested,
+        "downsampled": bucket != requested,
+        "series": [{"variant_id": variant_id, "points": series} for variant_id, series in points.items()],
+    }
@@ -0,0 +1,107 @@
+from typing import List
+
+from . import crud, passwords, schemas
+from .db import DBSession, run_db
+
+# Awaitable counterparts of the crud functions the routers use. Each one runs
+# the sync implementation through db.run_db, so the query code lives in
+# crud.py only and works on both the sync and the asyncio engine.
+
+# User
+
+async def get_user_by_username(db: DBSession, username: str, release: bool = False):
+    # release=True closes the session in the same hop, returning its connection
+    # to the pool before the caller waits on bcrypt; the user stays readable.
+    def fetch(session):
+        try:
+            return crud.get_user_by_username(session, username)
+        finally:
+            if release:
+                session.close()
+    return await run_db(db, fetch)
+
+async def create_user(db: DBSession, user: schemas.UserCreate):
+    # bcrypt is CPU-bound: hash on the dedicated hasher, never inside run_sync.
+    hashed_password = await passwords.hasher.hash(user.password)
+    return await run_db(db, crud.create_user, user, hashed_password)
+
+async def authenticate(db: DBSession, user, plain_password):
+    # Verify and, if the stored hash uses another work factor, store a fresh one.
+    matches, new_hash = await passwords.hasher.verify_and_update(plain_password, user.hashed_password)
+    if matches and new_hash:
+        from .routes.auth import invalidate_user  # routes.auth imports this module
+
+        await run_db(db, crud.update_password_hash, user.id, new_hash)
+        invalidate_user(user.id)
+    return matches
+
+# Product
+
+async def create_product(db: DBSession, product: schemas.ProductCreate, user_id: int):
+    return await run_db(db, crud.create_product, product, user_id)
+
+async def create_products(db: DBSession, products: List[schemas.ProductCreate], user_id: int):
+    return await run_db(db, crud.create_products, products, user_id)
+
+async def get_product(db: DBSession, product_id: int, user_id: int):
+    return await run_db(db, crud.get_product, product_id, user_id)
+
+async def get_products(db: DBSession, user_id: int, **page):
+    return await run_db(db, crud.get_products, user_id, **page)
+
+# Creative
+
+async def create_creative(db: DBSession, creative: schemas.CreativeCreate, user_id: int):
+    return await run_db(db, crud.create_creative, creative, user_id)
+
+async def create_creatives(db: DBSession, creatives: List[schemas.CreativeCreate], user_id: int):
+    return await run_db(db, crud.create_creatives, creatives, user_id)
+
+async def get_creatives_by_product(db: DBSession, product_id: int, user_id: int, **page):
+    return await run_db(db, crud.get_creatives_by_product, product_id, user_id, **page)
+
+async def get_creatives(db: DBSession, user_id: int, **page):
+    return await run_db(db, crud.get_creatives, user_id, **page)
+
+# AB Test
+
+async def create_abtest(db: DBSession, test: schemas.ABTestCreate, user_id: int):
+    return await run_db(db, crud.create_abtest, test, user_id)
+
+async def create_abtests(db: DBSession, tests: List[schemas.ABTestCreate], user_id: int):
+    return await run_db(db, crud.create_abtests, tests, user_id)
+
+async def get_abtests(db: DBSession, user_id: int, **page):
+    return await run_db(db, crud.get_abtests, user_id, **page)
+
+async def get_abtests_by_creative(db: DBSession, creative_id: int, user_id: int, **page):
+    return await run_db(db, crud.get_abtests_by_creative, creative_id, user_id, **page)
+
+async def variants_by_test(db: DBSession, test_ids, user_id: int):
+    return await run_db(db, crud.variants_by_test, test_ids, user_id)
+
+async def get_abtest_by_id(db: DBSession, abtest_id: int, user_id: int):
+    return await run_db(db, crud.get_abtest_by_id, abtest_id, user_id)
+
+# Performance
+
+async def log_performance(db: DBSession, perf: schemas.PerformanceCreate, user_id: int):
+    return await run_db(db, crud.log_performance, perf, user_id)
+
+async def bulk_log_performance(db: DBSession, perfs, user_id: int):
+    return await run_db(db, crud.bulk_log_performance, perfs, user_id)
+
+async def simulate_performance(db: DBSession, test_id: int, user_id: int):
+    return await run_db(db, crud.simulate_performance, test_id, user_id)
+
+async def get_performance_by_test(db: DBSession, test_id: int, user_id: int, **page):
+    return await run_db(db, crud.get_performance_by_test, test_id, user_id, **page)
+
+async def calculate_metrics(product_id: int, db: DBSession, user_id: int, **filters):
+    return await run_db(db, lambda session: crud.calculate_metrics(product_id, session, user_id, **filters))
+
+async def suggest_best_creative(db: DBSession, abtest_id: int, user_id: int):
+    return await run_db(db, crud.suggest_best_creative, abtest_id, user_id)
+
+async def get_timeseries(db: DBSession, test_id: int, user_id: int, **params):
+    return await run_db(db, lambda session: crud.get_timeseries(session, test_id, user_id, **params))
@@ -1,8 +1,13 @@
-from datetime import time
+import asyncio
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.exc import OperationalError
+import threading
+from typing import Union
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.exc import ArgumentError, OperationalError
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=".env")
@@ -13,21 +18,193 @@ POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Pool sizing: each worker process holds up to POOL_SIZE + MAX_OVERFLOW
+# connections, so workers * (POOL_SIZE + MAX_OVERFLOW) must stay below the
+# server's max_connections.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# DB_ASYNC=true serves requests through an asyncio engine (asyncpg/aiosqlite)
+# instead of the blocking engine plus FastAPI's threadpool.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def auto_migrate():
+    """Whether the lifespan creates the schema and applies migrations.
+
+    That is a deploy step (python -m app.migrations). DB_AUTO_MIGRATE=true
+    runs it in the lifespan instead; it defaults on for SQLite so tests and
+    local runs need no extra step. Decided at startup, not import, so a
+    missing or malformed URL only fails once the database is actually used.
+    """
+    setting = os.getenv("DB_AUTO_MIGRATE")
+    if setting is None:
+        try:
+            return make_url(DATABASE_URL).get_backend_name() == "sqlite"
+        except (ArgumentError, ValueError):
+            return False
+    return setting.lower() in ("1", "true", "yes")
+
+
+def engine_options(url: str, is_async: bool = False):
+    backend = make_url(url).get_backend_name()
+    options = {"pool_pre_ping": POOL_PRE_PING}
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            return options
+    options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT, pool_recycle=POOL_RECYCLE)
+    if backend == "postgresql" and STATEMENT_TIMEOUT_MS:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+
+# Engines are built on first use, not at import: importing the app needs
+# neither a reachable database nor its driver, and create_engine itself never
+# connects. Sessions ask for the engine when they are created.
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+
+
+def _count(name):
+    def listener(*args):
+        pool_counters[name] += 1
+    return listener
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+                for name, counter in (("connect", "connects"), ("checkout", "checkouts"),
+                                      ("checkin", "checkins"), ("invalidate", "invalidated")):
+                    event.listen(engine, name, _count(counter))
+                _engine = engine
+    return _engine
+
+
+def get_async_engine():
+    global _async_engine
+    if DB_ASYNC and _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(async_url(DATABASE_URL), **engine_options(DATABASE_URL, is_async=True))
+    return _async_engine
+
+
+def __getattr__(name):
+    # db.engine / db.async_engine still work, creating the engine on access.
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazySession(Session):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind or get_engine(), **kwargs)
+
+
+class LazyAsyncSession(AsyncSession):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind or get_async_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=LazySession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
-for _ in range(10):
+# Objects handed back from run_sync are read after the greenlet returns, so
+# they must not expire on commit.
+AsyncSessionLocal = async_sessionmaker(class_=LazyAsyncSession, expire_on_commit=False, autoflush=False)
+
+DBSession = Union[Session, AsyncSession]
+
+
+async def dispose_engines():
+    if _engine is not None:
+        _engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def _pool_status(pool):
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+
+def pool_stats():
+    stats = dict(pool_counters, **(_pool_status(_engine.pool) if _engine is not None else {"pool": None}))
+    if _async_engine is not None:
+        stats["async"] = _pool_status(_async_engine.sync_engine.pool)
+    return stats
+
+
+def get_sync_db():
+    db = SessionLocal()
     try:
-        engine = create_engine(DATABASE_URL)
-        # test connection
-        with engine.connect():
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+async def run_db(db: DBSession, fn, *args, **kwargs):
+    """Call a sync ``fn(session, ...)`` without blocking the event loop.
+
+    AsyncSession runs it through run_sync, so the driver's IO stays on the
+    loop; a plain Session runs it in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def _ping():
+    with get_engine().connect():
+        pass
+
+
+async def wait_for_db(attempts: int = 10, delay: float = 0.5, max_delay: float = 8.0):
+    # Connection attempts run in a worker thread and the backoff sleeps on the
+    # event loop, so a slow database never blocks the process.
+    for _ in range(attempts):
+        try:
+            await asyncio.to_thread(_ping)
             print("✅ Connected to database.")
-        break
-    except OperationalError:
-        print("⏳ Waiting for database to be ready...")
-        time.sleep(2)
-else:
-    raise Exception("❌ Could not connect to the database after several attempts.")
\ No newline at end of file
+            return
+        except OperationalError:
+            print(f"⏳ Waiting for database to be ready (retrying in {delay:.1f}s)...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+    raise RuntimeError("❌ Could not connect to the database after several attempts.")
@@ -0,0 +1,119 @@
+import csv
+import io
+from datetime import datetime
+from typing import Literal, get_args
+
+from sqlalchemy import select
+
+from .db import SessionLocal
+from .models import Creative, Performance
+
+# Streaming export of raw performance rows. Rows are read through a
+# server-side cursor (yield_per) in a session owned by the generator and
+# encoded one batch at a time, so memory stays flat whatever the row count.
+
+Format = Literal["csv", "arrow", "parquet"]
+FORMATS = get_args(Format)
+COLUMNS = ("id", "test_id", "variant_id", "impressions", "clicks", "conversions", "timestamp", "user_id")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def build_query(user_id: int, test_id: int = None, product_id: int = None,
+                start: datetime = None, end: datetime = None):
+    query = select(*(getattr(Performance, c) for c in COLUMNS)).where(Performance.user_id == user_id)
+    if test_id is not None:
+        query = query.where(Performance.test_id == test_id)
+    if product_id is not None:
+        variants = select(Creative.id).where(Creative.product_id == product_id, Creative.user_id == user_id)
+        query = query.where(Performance.variant_id.in_(variants))
+    if start is not None:
+        query = query.where(Performance.timestamp >= start)
+    if end is not None:
+        query = query.where(Performance.timestamp < end)
+    return query.order_by(Performance.id)
+
+
+def iter_batches(query, batch_size: int):
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=batch_size))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def csv_stream(query, batch_size: int):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for batch in iter_batches(query, batch_size):
+        writer.writerows(batch)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands its bytes back between batches."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _arrow_stream(query, batch_size: int, fmt: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()), ("test_id", pa.int64()), ("variant_id", pa.int64()),
+        ("impressions", pa.int64()), ("clicks", pa.int64()), ("conversions", pa.int64()),
+        ("timestamp", pa.timestamp("us")), ("user_id", pa.int64()),
+    ])
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+        write = writer.write_table
+    try:
+        for batch in iter_batches(query, batch_size):
+            columns = list(zip(*batch))
+            write(pa.Table.from_arrays([pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(fmt: str, query, batch_size: int = 10000):
+    if fmt == "csv":
+        return csv_stream(query, batch_size)
+    return _arrow_stream(query, batch_size, fmt)
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
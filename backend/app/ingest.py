@@ -0,0 +1,132 @@
+import codecs
+import csv
+import json
+import os
+from json import JSONDecodeError
+
+# Streaming parsers for bulk performance uploads. Each parser consumes an async
+# iterator of raw body chunks and yields one record at a time, so a request
+# never needs more memory than a single chunk plus one partial record.
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+# Largest single record a JSON array may hold; a longer undecodable tail is
+# treated as malformed instead of being buffered until the end of the body.
+MAX_RECORD_BYTES = int(os.getenv("BULK_MAX_RECORD_BYTES", "65536"))
+# A decode error further than this from the end of the buffer cannot be
+# caused by a record split across chunks (truncation fails in the last token).
+_TRUNCATION_SLACK = 64
+
+
+class MalformedPayload(ValueError):
+    pass
+
+
+class Unparseable:
+    """Placeholder yielded for a record that could not be decoded at all."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+async def _text(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _lines(chunks):
+    pending = ""
+    async for text in _text(chunks):
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def iter_ndjson(chunks):
+    async for line in _lines(chunks):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except JSONDecodeError as e:
+            yield Unparseable(str(e))
+
+
+async def iter_csv(chunks):
+    header = None
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield Unparseable(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield {k: v for k, v in zip(header, values) if v != ""}
+
+
+async def iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    buf, started = "", False
+    async for text in _text(chunks):
+        buf += text
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise MalformedPayload("JSON body must be an array of records")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+            except JSONDecodeError as e:
+                if e.pos + _TRUNCATION_SLACK < len(buf) and not e.msg.startswith("Unterminated string"):
+                    raise MalformedPayload(f"invalid JSON record: {e.msg}")
+                break  # incomplete record, wait for the next chunk
+            yield record
+        buf = buf[pos:]
+        if len(buf) > MAX_RECORD_BYTES:
+            raise MalformedPayload(f"invalid JSON record or record larger than {MAX_RECORD_BYTES} bytes")
+    raise MalformedPayload("unterminated or invalid JSON array")
+
+
+def parser_for(content_type: str):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return iter_ndjson
+    if media_type in CSV_TYPES:
+        return iter_csv
+    if media_type in JSON_TYPES or not media_type:
+        return iter_json_array
+    return None
+
+
+async def chunked(records, size: int):
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
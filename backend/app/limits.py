@@ -0,0 +1,261 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, HTTPException
+
+from .routes.auth import get_current_user
+
+# Admission control for the expensive endpoints. Each route class has a
+# per-user token bucket (rate limit) and a per-process concurrency cap
+# (bulkhead). Both fail fast: over the rate limit is 429, a full bulkhead is
+# 503, each with Retry-After, so an abusive client cannot queue up work that
+# holds DB connections and threadpool tokens everyone else needs.
+#
+# Buckets live in process memory by default, i.e. per worker. Set
+# RATE_LIMIT_STORE=redis to share them across workers; bulkheads stay per
+# process since they guard this process's pool and threadpool.
+#
+# Routes with a response cache admit only on a miss (admitted()), so cache
+# hits are free and a dashboard fanning out one request per product is
+# charged only for what it actually computes.
+#
+# RATE_LIMIT_ENABLED        false disables both limiters (true)
+# RATE_LIMIT_<CLASS>        "<requests per second>/<burst>", e.g. RATE_LIMIT_ANALYTICS=5/20
+# BULKHEAD_<CLASS>          concurrent requests per process, e.g. BULKHEAD_SIMULATE=2
+# BULKHEAD_QUEUE_MS         how long a request may wait for a bulkhead slot (0: reject at once)
+# RATE_LIMIT_STORE          memory (default) | redis
+# RATE_LIMIT_URL            redis URL, e.g. redis://localhost:6379/1
+# RATE_LIMIT_MAX_KEYS       buckets kept by the memory store (100000)
+
+DEFAULTS = {
+    # class: (rate per second, burst, concurrency)
+    "analytics": (5.0, 60, 8),
+    "simulate": (0.2, 3, 2),
+    "export": (0.5, 2, 2),
+}
+
+
+def _env_limits(name, rate, burst, concurrency):
+    spec = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if spec:
+        rate, _, burst = spec.partition("/")
+        rate = float(rate)
+        burst = float(burst or max(1.0, rate))
+    concurrency = int(os.getenv(f"BULKHEAD_{name.upper()}", concurrency))
+    return float(rate), float(burst), concurrency
+
+
+class MemoryStore:
+    """Token buckets in a bounded LRU; evicting a bucket only refills it early."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1.0):
+        """(allowed, seconds until ``cost`` tokens are available)."""
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def stats(self):
+        return {"keys": len(self._buckets)}
+
+
+_TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait = 0, (cost - tokens) / rate
+if tokens >= cost then
+  tokens, allowed, wait = tokens - cost, 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisStore:
+    """Token buckets shared through Redis; one script call per check, timed by the server clock."""
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, client, prefix="rl:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, rate, burst, cost=1.0):
+        allowed, wait = self._take(keys=[self.prefix + key], args=[rate, burst, cost])
+        return bool(allowed), float(wait)
+
+    def stats(self):
+        return {}
+
+
+class Bulkhead:
+    def __init__(self, limit, queue_timeout=0.0):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = self.rejected = 0
+        self.busy_seconds = 0.0
+        self._slots = None
+
+    def retry_after(self):
+        # Roughly one request's worth of work, from the average so far.
+        average = self.busy_seconds / self.admitted if self.admitted else 1.0
+        return max(1, math.ceil(average))
+
+    async def acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        if self._slots.locked() and self.queue_timeout <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, elapsed):
+        self.in_flight -= 1
+        self.admitted += 1
+        self.busy_seconds += elapsed
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "admitted_total": self.admitted,
+            "rejected_total": self.rejected,
+        }
+
+
+class RouteClass:
+    def __init__(self, name, rate, burst, concurrency, queue_timeout=0.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.bulkhead = Bulkhead(concurrency, queue_timeout)
+        self.throttled = 0
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "throttled_total": self.throttled,
+                "bulkhead": self.bulkhead.stats()}
+
+
+class Limiter:
+    def __init__(self, classes, store=None, enabled=True):
+        self.classes = {c.name: c for c in classes}
+        self.store = store or MemoryStore()
+        self.enabled = enabled
+
+    async def _take(self, route_class, user_id):
+        key = f"{route_class.name}:{user_id}"
+        if self.store.blocking:
+            return await asyncio.to_thread(self.store.take, key, route_class.rate, route_class.burst)
+        return self.store.take(key, route_class.rate, route_class.burst)
+
+    async def admit(self, name, user_id):
+        """Raise 429/503 if the request may not run now; else return the acquired route class."""
+        route_class = self.classes[name]
+        if route_class.rate > 0:
+            allowed, wait = await self._take(route_class, user_id)
+            if not allowed:
+                route_class.throttled += 1
+                raise HTTPException(status_code=429, detail=f"Rate limit exceeded for {name} requests",
+                                    headers={"Retry-After": str(max(1, math.ceil(wait)))})
+        bulkhead = route_class.bulkhead
+        if bulkhead.limit > 0 and not await bulkhead.acquire():
+            bulkhead.rejected += 1
+            raise HTTPException(status_code=503, detail=f"Too many {name} requests in progress",
+                                headers={"Retry-After": str(bulkhead.retry_after())})
+        return route_class
+
+    def stats(self):
+        return dict({name: c.stats() for name, c in self.classes.items()}, store=self.store.name,
+                    enabled=int(self.enabled), **self.store.stats())
+
+
+def from_env():
+    queue_timeout = float(os.getenv("BULKHEAD_QUEUE_MS", "0")) / 1000
+    classes = [RouteClass(name, *_env_limits(name, *spec), queue_timeout=queue_timeout) for name, spec in DEFAULTS.items()]
+    kind = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_STORE=redis requires the redis package") from e
+        store = RedisStore(redis.Redis.from_url(os.getenv("RATE_LIMIT_URL", "redis://localhost:6379/1")))
+    else:
+        store = MemoryStore(int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+    return Limiter(classes, store, enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes"))
+
+
+limiter = from_env()
+
+
+def configure(new_limiter):
+    global limiter
+    limiter = new_limiter
+    return limiter
+
+
+@asynccontextmanager
+async def admission(name: str, user_id: int):
+    """Hold the ``name`` class's rate limit and bulkhead for the body of the block."""
+    if not limiter.enabled:
+        yield
+        return
+    route_class = await limiter.admit(name, user_id)
+    if route_class.bulkhead.limit <= 0:
+        yield
+        return
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        route_class.bulkhead.release(time.monotonic() - started)
+
+
+async def admitted(name: str, user_id: int, compute):
+    """Await ``compute()`` under admission control, e.g. as a response cache's miss path."""
+    async with admission(name, user_id):
+        return await compute()
+
+
+def guard(name: str):
+    """Dependency applying the ``name`` class's rate limit and bulkhead to a route."""
+
+    async def dependency(current_user=Depends(get_current_user)):
+        async with admission(name, current_user.id):
+            yield
+
+    return dependency
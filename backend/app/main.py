@@ -1,12 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .db import Base, engine
-from .routes import product, creative, abtest, performance
+from .db import auto_migrate, dispose_engines, get_engine, pool_stats, wait_for_db
+from .routes import product, creative, abtest, performance, report
 from .routes import auth
+from . import limits, migrations, passwords, profiling, response_cache, write_buffer
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here connects unless auto-migrating; the engine connects on the first query.
+    if auto_migrate():
+        await wait_for_db()
+        await asyncio.to_thread(migrations.init_schema, get_engine())
+    write_buffer.buffer.recover()
+    write_buffer.buffer.start()
+    yield
+    await write_buffer.buffer.stop()
+    passwords.hasher.shutdown()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -15,14 +32,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Server-Timing", "X-DB-Statements", "X-DB-Rows", "X-Cache", "Retry-After"],
 )
 
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    stats = profiling.RequestStats()
+    token = profiling.current.set(stats)
+    sampler = profiling.sampler
+    if sampler is not None:
+        sampler.start(stats)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        if sampler is not None:
+            sampler.stop(stats)
+        raise
+    finally:
+        profiling.current.reset(token)
+    if profiling.PROFILE_HEADERS:
+        response.headers.update(profiling.headers(stats, stats.elapsed))
+    # The body is sent after this returns, and a StreamingResponse (/export)
+    # does most of its work then, so the request is recorded once it is sent.
+    body = response.body_iterator
+
+    async def recorded_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            if sampler is not None:
+                sampler.stop(stats)
+            elapsed = stats.elapsed
+            route = profiling.route_template(request.scope)
+            profiling.registry.observe(request.method, route, response.status_code, stats, elapsed)
+            if sampler is not None and elapsed * 1000 >= profiling.PROFILE_SLOW_MS:
+                await asyncio.to_thread(profiling.dump, stats, request.method, request.url.path, elapsed)
+
+    response.body_iterator = recorded_body()
+    return response
+
 app.include_router(product.router, prefix="/products", tags=["Products"])
 app.include_router(creative.router, prefix="/creatives", tags=["Creatives"])
 app.include_router(abtest.router, prefix="/tests", tags=["AB Tests"])
 app.include_router(performance.router, prefix="/performance", tags=["Performance"])
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
+app.include_router(report.router, prefix="/reports", tags=["Reports"])
 
 @app.get("/")
 def home():
-    return {"Home Page": "Ad Creative A/B Testing API"}
\ No newline at end of file
+    return {"Home Page": "Ad Creative A/B Testing API"}
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "db_pool": pool_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    gauges = profiling.flatten("db_pool", pool_stats())
+    gauges.update(profiling.flatten("user_cache", auth.user_cache.stats()))
+    gauges.update(profiling.flatten("response_cache", response_cache.stats()))
+    gauges.update(profiling.flatten("write_buffer", write_buffer.buffer.stats()))
+    gauges.update(profiling.flatten("password_hasher", passwords.hasher.stats()))
+    gauges.update(profiling.flatten("limits", limits.limiter.stats()))
+    return profiling.render(gauges)
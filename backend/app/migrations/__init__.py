@@ -0,0 +1,68 @@
+import importlib
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, insert, inspect, select
+
+# Ordered, append-only list of migration modules in this package. Each module
+# exposes upgrade(conn) and must be safe to run against a database that
+# create_all() has just built from the current models. Migrations spell out
+# the tables, columns and indexes they touch rather than reading models.py,
+# so what a version does never changes after it ships.
+MIGRATIONS = [
+    "v0001_ab_test_variants",
+    "v0002_tenant_indexes",
+    "v0003_keyset_indexes",
+    "v0004_performance_timestamp_index",
+    "v0005_backfill_rollups",
+]
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def index(name, table, *columns):
+    """A standalone Index on ``table(columns)``, independent of the ORM models."""
+    return Index(name, *Table(table, MetaData(), *(Column(c) for c in columns)).c)
+
+
+def create_indexes(conn, indexes):
+    """Create each (name, table, columns) index whose table exists and that is still missing."""
+    tables = set(inspect(conn).get_table_names())
+    for name, table, columns in indexes:
+        if table in tables:
+            index(name, table, *columns).create(conn, checkfirst=True)
+
+
+def init_schema(engine):
+    """Create missing tables from the models, then apply pending migrations."""
+    from ..db import Base
+    from .. import models  # noqa: F401  (registers every table on Base.metadata)
+
+    Base.metadata.create_all(bind=engine)
+    return upgrade(engine)
+
+
+def upgrade(engine):
+    """Apply pending migrations, each in its own transaction. Returns the versions applied."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version in MIGRATIONS:
+        if version in done:
+            continue
+        module = importlib.import_module(f"{__name__}.{version}")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(insert(schema_migrations).values(version=version, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
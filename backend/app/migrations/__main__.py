@@ -0,0 +1,9 @@
+import asyncio
+
+from ..db import get_engine, wait_for_db
+from . import init_schema
+
+# Deploy step: python -m app.migrations (creates missing tables, then migrates).
+asyncio.run(wait_for_db())
+applied = init_schema(get_engine())
+print(f"✅ Applied migrations: {', '.join(applied)}" if applied else "✅ Database schema is up to date.")
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table, inspect, select, text
+
+from . import index
+
+# Moves ab_tests.variant_ids (comma-separated text) into ab_test_variants and
+# drops the old column. Ids that do not reference an existing creative are
+# discarded, since the join table enforces the foreign key.
+
+
+def _variants_table(conn):
+    # The referenced tables are reflected so the foreign keys can resolve.
+    meta = MetaData()
+    Table("ab_tests", meta, autoload_with=conn)
+    creatives = Table("creatives", meta, autoload_with=conn)
+    variants = Table(
+        "ab_test_variants",
+        meta,
+        Column("test_id", Integer, ForeignKey("ab_tests.id", ondelete="CASCADE"), primary_key=True),
+        Column("creative_id", Integer, ForeignKey("creatives.id"), primary_key=True),
+        Column("position", Integer, nullable=False, default=0),
+    )
+    return variants, creatives
+
+
+def upgrade(conn):
+    insp = inspect(conn)
+    if "ab_tests" not in insp.get_table_names():
+        return
+    variants, creatives = _variants_table(conn)
+    if "ab_test_variants" not in insp.get_table_names():
+        variants.create(conn)
+        index("ix_ab_test_variants_creative_test", "ab_test_variants", "creative_id", "test_id").create(conn)
+    columns = {c["name"] for c in insp.get_columns("ab_tests")}
+    if "variant_ids" not in columns:
+        return
+    known = set(conn.execute(select(creatives.c.id)).scalars())
+    rows = []
+    for test_id, raw in conn.execute(text("SELECT id, variant_ids FROM ab_tests")):
+        ids = [int(v) for v in (raw or "").split(",") if v.strip()]
+        ids = [v for v in dict.fromkeys(ids) if v in known]
+        rows.extend({"test_id": test_id, "creative_id": cid, "position": i} for i, cid in enumerate(ids))
+    if rows:
+        conn.execute(variants.insert(), rows)
+    conn.execute(text("ALTER TABLE ab_tests DROP COLUMN variant_ids"))
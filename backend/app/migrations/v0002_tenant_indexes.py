@@ -0,0 +1,18 @@
+from . import create_indexes
+
+# Indexes for the (user_id, foreign key) access paths used throughout crud.py.
+# The models declare them too, so fresh databases get them from create_all().
+
+INDEXES = (
+    ("ix_products_user_id", "products", ("user_id",)),
+    ("ix_creatives_user_product", "creatives", ("user_id", "product_id")),
+    ("ix_ab_tests_user_id", "ab_tests", ("user_id",)),
+    ("ix_ab_test_variants_creative_test", "ab_test_variants", ("creative_id", "test_id")),
+    ("ix_performance_test_user", "performance", ("test_id", "user_id")),
+    ("ix_performance_variant_user", "performance", ("variant_id", "user_id")),
+    ("ix_performance_rollups_variant_user", "performance_rollups", ("variant_id", "user_id", "granularity")),
+)
+
+
+def upgrade(conn):
+    create_indexes(conn, INDEXES)
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect
+
+from . import index
+
+# Extends the tenant indexes with a trailing id so keyset pages
+# (WHERE user_id = ? AND id > ? ORDER BY id LIMIT n) are served in index order.
+
+REBUILT = (
+    ("ix_products_user_id", "products", ("user_id", "id")),
+    ("ix_creatives_user_id", "creatives", ("user_id", "id")),
+    ("ix_creatives_user_product", "creatives", ("user_id", "product_id", "id")),
+    ("ix_ab_tests_user_id", "ab_tests", ("user_id", "id")),
+    ("ix_performance_test_user", "performance", ("test_id", "user_id", "id")),
+)
+
+
+def upgrade(conn):
+    insp = inspect(conn)
+    existing_tables = set(insp.get_table_names())
+    current = {}
+    for name, table, columns in REBUILT:
+        if table not in existing_tables:
+            continue
+        if table not in current:
+            current[table] = {ix["name"]: ix["column_names"] for ix in insp.get_indexes(table)}
+        if current[table].get(name) == list(columns):
+            continue
+        if name in current[table]:
+            index(name, table, *current[table][name]).drop(conn)
+        index(name, table, *columns).create(conn)
@@ -0,0 +1,12 @@
+from . import create_indexes
+
+# (test_id, timestamp) serves the time-series endpoint when a window is not
+# bucket-aligned and has to be answered from raw performance rows.
+
+INDEXES = (
+    ("ix_performance_test_timestamp", "performance", ("test_id", "timestamp")),
+)
+
+
+def upgrade(conn):
+    create_indexes(conn, INDEXES)
@@ -0,0 +1,66 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, literal, select, text
+
+# performance_rollups is created empty by create_all() on databases that
+# predate it, while metrics and suggestions read from it. Fill it once from
+# the raw rows; later writes keep it current through rollup.apply(). The
+# bucketing is spelled out here, as of this version, rather than calling
+# rollup.rebuild() on the live models.
+
+_meta = MetaData()
+performance = Table(
+    "performance",
+    _meta,
+    Column("id", Integer, primary_key=True),
+    Column("test_id", Integer),
+    Column("variant_id", Integer),
+    Column("impressions", Integer),
+    Column("clicks", Integer),
+    Column("conversions", Integer),
+    Column("timestamp", DateTime),
+    Column("user_id", Integer),
+)
+performance_rollups = Table(
+    "performance_rollups",
+    _meta,
+    Column("id", Integer, primary_key=True),
+    Column("test_id", Integer),
+    Column("variant_id", Integer),
+    Column("granularity", String),
+    Column("bucket_start", DateTime),
+    Column("impressions", Integer),
+    Column("clicks", Integer),
+    Column("conversions", Integer),
+    Column("user_id", Integer),
+)
+
+COUNTERS = ("impressions", "clicks", "conversions")
+
+
+def _bucket(conn, granularity):
+    ts = performance.c.timestamp
+    if conn.dialect.name == "postgresql":
+        return func.date_trunc(granularity, ts)
+    # SQLite stores DateTime as text; match the format rollup.apply() writes.
+    return func.strftime("%Y-%m-%d %H:00:00.000000" if granularity == "hour" else "%Y-%m-%d 00:00:00.000000", ts)
+
+
+def upgrade(conn):
+    tables = set(inspect(conn).get_table_names())
+    if not {"performance", "performance_rollups"} <= tables:
+        return
+    if conn.execute(text("SELECT 1 FROM performance_rollups LIMIT 1")).first() is not None:
+        return
+    if conn.execute(text("SELECT 1 FROM performance LIMIT 1")).first() is None:
+        return
+    keys = (performance.c.user_id, performance.c.test_id, performance.c.variant_id)
+    buckets = 0
+    for granularity in ("hour", "day"):
+        bucket = _bucket(conn, granularity)
+        rows = select(
+            *keys, literal(granularity), bucket,
+            *(func.coalesce(func.sum(performance.c[c]), 0) for c in COUNTERS),
+        ).where(performance.c.timestamp.isnot(None)).group_by(*keys, bucket)
+        buckets += conn.execute(insert(performance_rollups).from_select(
+            ["user_id", "test_id", "variant_id", "granularity", "bucket_start", *COUNTERS], rows,
+        )).rowcount
+    print(f"♻️ Backfilled {buckets} performance rollup buckets")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -15,6 +15,9 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_user_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String)
@@ -27,6 +30,10 @@ class Product(Base):
 
 class Creative(Base):
     __tablename__ = "creatives"
+    __table_args__ = (
+        Index("ix_creatives_user_id", "user_id", "id"),
+        Index("ix_creatives_user_product", "user_id", "product_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey("products.id"))
@@ -40,25 +47,46 @@ class Creative(Base):
 
 class ABTest(Base):
     __tablename__ = "ab_tests"
+    __table_args__ = (
+        Index("ix_ab_tests_user_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey("products.id"))
-    variant_ids = Column(Text)  # comma-separated
     start_date = Column(DateTime, default=datetime.utcnow)
     end_date = Column(DateTime, nullable=True)
     status = Column(String, default="running")
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="abtests")
+    variants = relationship(
+        "ABTestVariant", back_populates="test", order_by="ABTestVariant.position", cascade="all, delete-orphan"
+    )
 
     @property
     def variant_ids_list(self):
-        if self.variant_ids:
-            return list(map(int, self.variant_ids.split(',')))
-        return []
+        return [v.creative_id for v in self.variants]
+
+
+class ABTestVariant(Base):
+    __tablename__ = "ab_test_variants"
+    __table_args__ = (
+        Index("ix_ab_test_variants_creative_test", "creative_id", "test_id"),
+    )
+
+    test_id = Column(Integer, ForeignKey("ab_tests.id", ondelete="CASCADE"), primary_key=True)
+    creative_id = Column(Integer, ForeignKey("creatives.id"), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    test = relationship("ABTest", back_populates="variants")
+    creative = relationship("Creative")
 
 
 class Performance(Base):
     __tablename__ = "performance"
+    __table_args__ = (
+        Index("ix_performance_test_user", "test_id", "user_id", "id"),
+        Index("ix_performance_variant_user", "variant_id", "user_id"),
+        Index("ix_performance_test_timestamp", "test_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True)
     test_id = Column(Integer, ForeignKey("ab_tests.id"))
@@ -68,4 +96,22 @@ class Performance(Base):
     conversions = Column(Integer)
     timestamp = Column(DateTime, default=datetime.now)
     user_id = Column(Integer, ForeignKey("users.id"))
-    user = relationship("User", back_populates="performances")
\ No newline at end of file
+    user = relationship("User", back_populates="performances")
+
+
+class PerformanceRollup(Base):
+    __tablename__ = "performance_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "test_id", "variant_id", "granularity", "bucket_start", name="uq_performance_rollup_bucket"),
+        Index("ix_performance_rollups_variant_user", "variant_id", "user_id", "granularity"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    test_id = Column(Integer, ForeignKey("ab_tests.id"))
+    variant_id = Column(Integer, ForeignKey("creatives.id"))
+    granularity = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    impressions = Column(Integer, nullable=False, default=0)
+    clicks = Column(Integer, nullable=False, default=0)
+    conversions = Column(Integer, nullable=False, default=0)
+    user_id = Column(Integer, ForeignKey("users.id"))
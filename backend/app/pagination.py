@@ -0,0 +1,71 @@
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Keyset pagination for list routes: rows come back ordered by id, ?after=<id>
+# continues from a cursor and ?fields=a,b restricts the columns loaded and
+# returned. The body stays a plain JSON list; the next cursor travels in the
+# X-Next-Cursor and Link headers. Every call is bounded: without limit a page
+# holds PAGE_SIZE_DEFAULT rows, so no listing grows with a tenant's data.
+# Clients that want everything follow the cursor (see frontend api/axios.js).
+
+DEFAULT_LIMIT = int(os.getenv("PAGE_SIZE_DEFAULT", "500"))
+MAX_LIMIT = int(os.getenv("PAGE_SIZE_MAX", "5000"))
+
+
+class Page:
+    def __init__(self, request: Request, response: Response, limit: int, after: Optional[int], fields: Optional[list]):
+        self.request = request
+        self.response = response
+        self.limit = limit
+        self.after = after
+        self.fields = fields
+
+    @property
+    def fetch_limit(self):
+        # One extra row tells us whether another page exists.
+        return self.limit + 1
+
+    def query_args(self):
+        return {"limit": self.fetch_limit, "after": self.after, "fields": self.fields}
+
+    def respond(self, items):
+        has_more = len(items) > self.limit
+        items = items[:self.limit]
+        headers = {}
+        if has_more:
+            last = items[-1]
+            cursor = last["id"] if isinstance(last, dict) else last.id
+            headers["X-Next-Cursor"] = str(cursor)
+            headers["Link"] = f'<{self.request.url.include_query_params(after=cursor)}>; rel="next"'
+        if self.fields:
+            # Partial rows would not validate against the route's response_model.
+            return JSONResponse(jsonable_encoder(items), headers=headers)
+        self.response.headers.update(headers)
+        return items
+
+
+def paginate(schema):
+    """Build the page dependency for a route whose full rows match ``schema``."""
+    allowed = list(schema.model_fields)
+
+    def dependency(
+        request: Request,
+        response: Response,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+        after: Optional[int] = Query(None, ge=0, description="Return rows with id greater than this cursor"),
+        fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(allowed)}"),
+    ):
+        names = None
+        if fields:
+            names = [f.strip() for f in fields.split(",") if f.strip()]
+            unknown = sorted(set(names) - set(allowed))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+            names = ["id"] + [f for f in dict.fromkeys(names) if f != "id"]
+        return Page(request, response, limit, after, names)
+
+    return dependency
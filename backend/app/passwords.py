@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+# bcrypt runs on its own small executor so a burst of logins queues here
+# instead of taking every threadpool token the sync routes need.
+#
+# BCRYPT_ROUNDS      work factor for new hashes (12); older hashes are
+#                    rehashed on the next successful login
+# HASH_EXECUTOR      thread (default) | process | shared (the app threadpool, no isolation)
+# HASH_WORKERS       concurrent hash operations (cpu count - 1, at least 1)
+# HASH_MAX_PENDING   queued + running operations before new ones wait (workers * 16)
+# HASH_QUEUE_TIMEOUT seconds to wait for a slot before HashingBusy (5)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+@lru_cache(maxsize=None)
+def context(rounds: int = BCRYPT_ROUNDS):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+pwd_context = context()
+
+
+# Module-level so a process pool can pickle them.
+def _hash(password, rounds):
+    return context(rounds).hash(password)
+
+
+def _verify_and_update(password, hashed, rounds):
+    return context(rounds).verify_and_update(password, hashed)
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+class Hasher:
+    def __init__(self, rounds=BCRYPT_ROUNDS, mode="thread", workers=None, max_pending=None, queue_timeout=5.0):
+        self.rounds = rounds
+        self.mode = mode
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending or self.workers * 16
+        self.queue_timeout = queue_timeout
+        self.completed = self.rejected = 0
+        self.busy_seconds = 0.0
+        self._in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    async def _run(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashingBusy(f"{self.max_pending} password hash operations already pending")
+        self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            if self.mode == "shared":
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self.completed += 1
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed: str):
+        """(matches, new_hash); new_hash is set when ``hashed`` uses another work factor."""
+        return await self._run(_verify_and_update, password, hashed, self.rounds)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "completed_total": self.completed,
+            "rejected_total": self.rejected,
+            "busy_seconds_total": self.busy_seconds,
+        }
+
+
+hasher = Hasher(
+    rounds=BCRYPT_ROUNDS,
+    mode=os.getenv("HASH_EXECUTOR", "thread"),
+    workers=int(os.getenv("HASH_WORKERS", "0")) or None,
+    max_pending=int(os.getenv("HASH_MAX_PENDING", "0")) or None,
+    queue_timeout=float(os.getenv("HASH_QUEUE_TIMEOUT", "5")),
+)
+
+
+def configure(**options):
+    """Replace the module hasher, e.g. configure(rounds=10, workers=2)."""
+    global hasher
+    hasher.shutdown()
+    hasher = Hasher(**options)
+    return hasher
@@ -0,0 +1,309 @@
+"""Per-request SQL/latency accounting, Prometheus text output and a sampling profiler.
+
+The middleware in main.py opens a RequestStats for each request and stores it
+in a contextvar. Engine and ORM event hooks registered below add to whichever
+RequestStats is current. The threadpool, asyncio.to_thread and run_sync all
+copy the context, so the same mutable object is shared with the threads that
+serve the request.
+
+Env:
+    PROFILE_HEADERS=1     add Server-Timing / X-DB-* headers to every response
+    PROFILE_SLOW_MS=250   sample stacks and dump a folded profile for requests
+                          slower than this (unset = profiler off)
+    PROFILE_INTERVAL_MS   sampling interval, default 5
+    PROFILE_DIR           where folded stacks are written, default ./profiles
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import CursorResult, Engine
+from sqlalchemy.engine.cursor import ResultFetchStrategy
+
+PROFILE_HEADERS = os.getenv("PROFILE_HEADERS", "").lower() in ("1", "true", "yes")
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS")) if os.getenv("PROFILE_SLOW_MS") else None
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    __slots__ = ("started", "statements", "db_seconds", "rows", "threads", "samples")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.threads = {threading.get_ident()}
+        self.samples = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += time.perf_counter() - started
+    stats.threads.add(threading.get_ident())
+    # Result rows are counted as they are fetched (_CountRows); statements
+    # without a result set report the rows they changed.
+    if cursor.description is None and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+class _CountRows(ResultFetchStrategy):
+    """Fetch strategy that hands rows through from ``inner`` and counts them.
+
+    Installed on every row-returning result, so ORM loads, column and
+    aggregate SELECTs, RETURNING and streamed (yield_per) results all count.
+    """
+
+    __slots__ = ("inner", "stats")
+
+    def __init__(self, inner, stats: RequestStats):
+        self.inner = inner
+        self.stats = stats
+
+    @property
+    def alternate_cursor_description(self):
+        return self.inner.alternate_cursor_description
+
+    def soft_close(self, result, dbapi_cursor):
+        self.inner.soft_close(result, dbapi_cursor)
+
+    def hard_close(self, result, dbapi_cursor):
+        self.inner.hard_close(result, dbapi_cursor)
+
+    def handle_exception(self, result, dbapi_cursor, err):
+        self.inner.handle_exception(result, dbapi_cursor, err)
+
+    def yield_per(self, result, dbapi_cursor, num):
+        self.inner.yield_per(result, dbapi_cursor, num)
+        if result.cursor_strategy is not self:  # swapped for a buffered strategy
+            self.inner = result.cursor_strategy
+            result.cursor_strategy = self
+
+    def fetchone(self, result, dbapi_cursor, hard_close=False):
+        row = self.inner.fetchone(result, dbapi_cursor, hard_close)
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    def fetchmany(self, result, dbapi_cursor, size=None):
+        rows = self.inner.fetchmany(result, dbapi_cursor, size)
+        self.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self, result, dbapi_cursor):
+        rows = self.inner.fetchall(result, dbapi_cursor)
+        self.stats.rows += len(rows)
+        return rows
+
+
+@event.listens_for(Engine, "after_execute")
+def _after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+    stats = current.get()
+    if stats is not None and isinstance(result, CursorResult) and result.returns_rows:
+        result.cursor_strategy = _CountRows(result.cursor_strategy, stats)
+
+
+class Registry:
+    """Aggregated per-route counters. Only touched from the event loop thread."""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.latency_sum = defaultdict(float)
+        self.latency_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.statements = Counter()
+        self.db_seconds = defaultdict(float)
+        self.rows = Counter()
+        self.slow_profiles = 0
+
+    def observe(self, method, route, status, stats: RequestStats, elapsed):
+        key = (method, route)
+        self.requests[key + (str(status),)] += 1
+        self.latency_sum[key] += elapsed
+        buckets = self.latency_buckets[key]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                buckets[i] += 1
+        buckets[-1] += 1
+        self.statements[key] += stats.statements
+        self.db_seconds[key] += stats.db_seconds
+        self.rows[key] += stats.rows
+
+
+registry = Registry()
+
+
+def route_template(scope):
+    """Full path template of the matched route, e.g. ``/performance/suggest/{abtest_id}``.
+
+    Routes of an included router may report only their own path, so the
+    include prefix is recovered from the concrete request path.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", route.path)
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError):
+        return template
+    path = scope["path"]
+    return path[: len(path) - len(rendered)] + template if path.endswith(rendered) else template
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def render(gauges=None):
+    """Prometheus text exposition of the registry plus flat ``gauges``."""
+    lines = ["# TYPE http_requests_total counter"]
+    for (method, route, status), n in sorted(registry.requests.items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {n}")
+    lines.append("# TYPE http_request_duration_seconds histogram")
+    for (method, route), buckets in sorted(registry.latency_buckets.items()):
+        for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {n}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {registry.latency_sum[(method, route)]:.6f}")
+        lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {buckets[-1]}")
+    for name, kind, values in (
+        ("db_statements_total", "counter", registry.statements),
+        ("db_time_seconds_total", "counter", registry.db_seconds),
+        ("db_rows_total", "counter", registry.rows),
+    ):
+        lines.append(f"# TYPE {name} {kind}")
+        for (method, route), value in sorted(values.items()):
+            lines.append(f"{name}{_labels(method=method, route=route)} {value:g}")
+    lines.append("# TYPE profiler_slow_requests_total counter")
+    lines.append(f"profiler_slow_requests_total {registry.slow_profiles}")
+    for name, value in sorted((gauges or {}).items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def flatten(prefix, stats):
+    """Turn nested stats dicts (pool_stats, cache.stats) into gauge names."""
+    gauges = {}
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            gauges.update(flatten(name, value))
+        else:
+            gauges[name] = value
+    return gauges
+
+
+def headers(stats: RequestStats, elapsed):
+    return {
+        "Server-Timing": f"app;dur={elapsed * 1000:.1f}, db;dur={stats.db_seconds * 1000:.1f}",
+        "X-DB-Statements": str(stats.statements),
+        "X-DB-Rows": str(stats.rows),
+    }
+
+
+class Sampler:
+    """Samples the stacks of the threads serving in-flight requests.
+
+    A single daemon thread wakes every PROFILE_INTERVAL while at least one
+    request is active and adds the folded stack of each thread in that
+    request's ``threads`` set. Async routes share the event loop thread, so
+    concurrent requests can see each other's samples; the profile is a guide
+    to where the time went, not an exact attribution.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self, stats: RequestStats):
+        stats.samples = Counter()
+        with self.lock:
+            self.active.add(stats)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def stop(self, stats: RequestStats):
+        with self.lock:
+            self.active.discard(stats)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self.lock:
+                active = list(self.active)
+                if not active:
+                    self.wake.clear()
+            if not active:
+                self.wake.wait()
+                continue
+            frames = sys._current_frames()
+            for stats in active:
+                for ident in list(stats.threads):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        stats.samples[_fold(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def dump(stats: RequestStats, method, path, elapsed):
+    """Write folded stacks (flamegraph.pl / speedscope format) for a slow request."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    name = f"{datetime.now():%Y%m%dT%H%M%S%f}-{method}-{slug}-{elapsed * 1000:.0f}ms.folded"
+    filename = os.path.join(PROFILE_DIR, name)
+    with open(filename, "w") as f:
+        for stack, count in stats.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    registry.slow_profiles += 1
+    return filename
+
+
+sampler = Sampler(PROFILE_INTERVAL) if PROFILE_SLOW_MS is not None else None
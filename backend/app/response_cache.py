@@ -0,0 +1,239 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import MISSING, TTLCache
+
+# Cached responses for the read-heavy analytics endpoints (/performance/metrics
+# and /performance/suggest). Keys embed a generation number per tag
+# ("product:<id>", "test:<id>"); ingestion bumps the generations of the tests
+# and products it wrote to, so stale entries are never read again and simply
+# age out. With the in-process backend generations are per worker; point
+# RESPONSE_CACHE_BACKEND at Redis to share them across workers.
+#
+# Every key also carries the "all" tag, which invalidate_all() bumps (e.g.
+# after a rollup rebuild).
+#
+# RESPONSE_CACHE_BACKEND: memory (default) | redis | fakeredis | off
+# RESPONSE_CACHE_URL:     redis URL, e.g. redis://localhost:6379/0
+# RESPONSE_CACHE_SIZE / RESPONSE_CACHE_TTL: LRU bound and entry lifetime (s)
+# RESPONSE_CACHE_MAX_TAGS: generation counters kept in memory (100000)
+
+
+class LocalBackend:
+    """In-process LRU with TTL; values are stored as-is, not serialised."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, maxsize: int, ttl: float, max_tags: int = 100000):
+        self.entries = TTLCache(maxsize, ttl)
+        self.max_tags = max_tags
+        # Least recently bumped tags are dropped past max_tags. Unknown tags
+        # read as _floor, which stays above every dropped generation, so a
+        # dropped tag never returns to a number its old entries were keyed with.
+        self._generations = OrderedDict()
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.entries.enabled
+
+    def get(self, key):
+        value = self.entries.get(key)
+        return None if value is MISSING else value
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, self._floor) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.pop(tag, self._floor) + 1
+            while len(self._generations) > self.max_tags:
+                _, dropped = self._generations.popitem(last=False)
+                self._floor = max(self._floor, dropped + 1)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return dict(self.entries.stats(), ttl=self.entries.ttl, tags=len(self._generations))
+
+
+class RedisBackend:
+    """Any client with redis-py's get/set(ex=)/mget/incr/delete works here."""
+
+    name = "redis"
+    blocking = True
+    enabled = True
+
+    def __init__(self, client, ttl: float, prefix: str = "rc:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, math.ceil(self.ttl)))
+
+    def generations(self, tags):
+        return [int(v or 0) for v in self.client.mget([self.prefix + "gen:" + tag for tag in tags])]
+
+    def bump(self, tags):
+        # Counters never expire: a counter that restarted from 0 could land on
+        # a generation whose entry is still cached. They are a few bytes per
+        # tag, bounded by the number of tests and products.
+        for tag in tags:
+            self.client.incr(self.prefix + "gen:" + tag)
+
+    def stats(self):
+        # Evictions happen inside Redis (maxmemory policy), so only the
+        # client-side counters are reported.
+        return {"hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+class FakeRedis:
+    """Small in-process stand-in for a Redis client, for development and benchmarks."""
+
+    def __init__(self, clock=time.monotonic):
+        self._data = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _live(self, name):
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._data[name]
+            return None
+        return value
+
+    def get(self, name):
+        with self._lock:
+            return self._live(name)
+
+    def mget(self, names):
+        with self._lock:
+            return [self._live(name) for name in names]
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[name] = (value, self._clock() + ex if ex else None)
+        return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._live(name) or 0) + amount
+            self._data[name] = (str(value).encode(), None)
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+
+def from_env():
+    kind = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    size = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    if kind == "off":
+        return LocalBackend(0, 0)
+    if kind == "fakeredis":
+        return RedisBackend(FakeRedis(), ttl)
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package") from e
+        return RedisBackend(redis.Redis.from_url(os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")), ttl)
+    return LocalBackend(size, ttl, int(os.getenv("RESPONSE_CACHE_MAX_TAGS", "100000")))
+
+
+backend = from_env()
+
+
+def configure(new_backend):
+    global backend
+    backend = new_backend
+
+
+ALL = "all"
+
+
+def tag(kind: str, ident) -> str:
+    return f"{kind}:{ident}"
+
+
+def _key(name, user_id, params, tags, generations):
+    params = json.dumps(params, sort_keys=True, default=str)
+    versions = ",".join(f"{t}@{g}" for t, g in zip(tags, generations))
+    return f"{name}:{user_id}:{params}:{versions}"
+
+
+def _lookup(name, user_id, params, tags):
+    key = _key(name, user_id, params, tags, backend.generations(tags))
+    return key, backend.get(key)
+
+
+async def cached(name: str, user_id: int, params: dict, tags, compute, response=None):
+    """Return the cached result for (name, user, params) or await ``compute()`` and store it.
+
+    ``tags`` name the tests/products the result depends on. If ``response``
+    is given, an X-Cache: HIT|MISS header is set on it.
+    """
+    if not backend.enabled:
+        return await compute()
+    tags = [ALL, *tags]
+    if backend.blocking:
+        key, value = await asyncio.to_thread(_lookup, name, user_id, params, tags)
+    else:
+        key, value = _lookup(name, user_id, params, tags)
+    if response is not None:
+        response.headers["X-Cache"] = "MISS" if value is None else "HIT"
+    if value is not None:
+        return value
+    value = await compute()
+    if value is not None:
+        if backend.blocking:
+            await asyncio.to_thread(backend.set, key, value)
+        else:
+            backend.set(key, value)
+    return value
+
+
+def invalidate(test_ids=(), product_ids=()):
+    tags = [tag("test", t) for t in set(test_ids)] + [tag("product", p) for p in set(product_ids)]
+    if tags and backend.enabled:
+        backend.bump(tags)
+
+
+def invalidate_all():
+    """Make every cached response stale, e.g. after rollups were recomputed."""
+    if backend.enabled:
+        backend.bump([ALL])
+
+
+def stats():
+    return dict(backend.stats(), backend=backend.name)
@@ -0,0 +1,140 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import response_cache
+from .models import ABTest, Performance, PerformanceRollup
+
+# Per-(user, test, variant) counter totals in hour and day buckets. Ingestion
+# calls apply() inside its own transaction; rebuild() recomputes from raw rows.
+
+COUNTERS = ("impressions", "clicks", "conversions")
+KEY = ("user_id", "test_id", "variant_id", "granularity", "bucket_start")
+
+
+def truncate(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"unknown granularity {granularity!r}")
+
+
+def is_aligned(ts: datetime, granularity: str) -> bool:
+    return ts is None or truncate(ts, granularity) == ts
+
+
+def _bucketize(rows):
+    totals = defaultdict(lambda: [0, 0, 0])
+    starts = {}  # rows in a batch share few distinct timestamps
+    for row in rows:
+        ts = row["timestamp"]
+        buckets = starts.get(ts)
+        if buckets is None:
+            buckets = starts[ts] = (("hour", truncate(ts, "hour")), ("day", truncate(ts, "day")))
+        for granularity, bucket_start in buckets:
+            acc = totals[(row["user_id"], row["test_id"], row["variant_id"], granularity, bucket_start)]
+            acc[0] += row["impressions"] or 0
+            acc[1] += row["clicks"] or 0
+            acc[2] += row["conversions"] or 0
+    return [dict(zip(KEY, key), **dict(zip(COUNTERS, acc))) for key, acc in totals.items()]
+
+
+def apply(db: Session, rows):
+    """Fold raw performance rows (dicts or Performance objects) into the rollup."""
+    rows = [r if isinstance(r, dict) else {c: getattr(r, c) for c in KEY[:3] + COUNTERS + ("timestamp",)} for r in rows]
+    buckets = _bucketize(rows)
+    if not buckets:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(PerformanceRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY),
+            set_={c: getattr(PerformanceRollup, c) + getattr(stmt.excluded, c) for c in COUNTERS},
+        )
+        db.execute(stmt, buckets)
+    else:
+        for bucket in buckets:
+            match = [getattr(PerformanceRollup, k) == bucket[k] for k in KEY]
+            updated = db.execute(
+                update(PerformanceRollup).where(*match).values(
+                    {c: getattr(PerformanceRollup, c) + bucket[c] for c in COUNTERS}
+                )
+            ).rowcount
+            if not updated:
+                db.add(PerformanceRollup(**bucket))
+    return len(buckets)
+
+
+def bucket_expr(db: Session, bucket: str, column):
+    # Start of the hour/day/ISO week (Monday) containing each value.
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(bucket, column)
+    if bucket == "week":
+        return func.strftime("%Y-%m-%d 00:00:00", column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-%d %H:00:00" if bucket == "hour" else "%Y-%m-%d 00:00:00", column)
+
+
+def rebuild(db: Session, test_id: int = None, batch_size: int = 5000):
+    """Recompute rollups from raw rows, for one test or for everything."""
+    delete_q = db.query(PerformanceRollup)
+    if test_id is not None:
+        delete_q = delete_q.filter(PerformanceRollup.test_id == test_id)
+    delete_q.delete(synchronize_session=False)
+
+    hour = bucket_expr(db, "hour", Performance.timestamp).label("hour")
+    q = select(
+        Performance.user_id, Performance.test_id, Performance.variant_id, hour,
+        *(func.coalesce(func.sum(getattr(Performance, c)), 0) for c in COUNTERS),
+    ).where(Performance.timestamp.isnot(None)).group_by(
+        Performance.user_id, Performance.test_id, Performance.variant_id, hour
+    )
+    if test_id is not None:
+        q = q.where(Performance.test_id == test_id)
+
+    # Hourly groups are already small; stream them and fold in batches.
+    total, pending = 0, []
+    for user_id, t_id, variant_id, ts, *counts in db.execute(q).yield_per(batch_size):
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts)
+        pending.append(dict(user_id=user_id, test_id=t_id, variant_id=variant_id, timestamp=ts, **dict(zip(COUNTERS, counts))))
+        if len(pending) >= batch_size:
+            total += apply(db, pending)
+            pending = []
+    total += apply(db, pending)
+    db.commit()
+    if test_id is None:
+        response_cache.invalidate_all()
+    else:
+        product_ids = [p for (p,) in db.query(ABTest.product_id).filter(ABTest.id == test_id)]
+        response_cache.invalidate(test_ids=[test_id], product_ids=product_ids)
+    return total
+
+
+def main():
+    from .db import SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m app.rollup")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="recompute rollups from raw performance rows")
+    rebuild_cmd.add_argument("--test-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuild(db, test_id=args.test_id)
+        # Cached responses in running workers are only reached through a
+        # shared (redis) cache backend; in-process caches expire after their TTL.
+        print("✅ Rebuilt performance rollups.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
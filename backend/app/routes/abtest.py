@@ -1,27 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app import schemas, crud
-from app.db import SessionLocal
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query
+from app import bandit, schemas, crud_async
+from app.crud import InvalidReferences
+from app.db import DBSession, get_db, run_db
+from app.pagination import Page, paginate
 from app.routes.auth import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
-
 @router.post("/", response_model=schemas.ABTestOut)
-def create(test: schemas.ABTestCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.create_abtest(db, test, user_id=current_user.id)
+async def create(test: schemas.ABTestCreate, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.create_abtest(db, test, user_id=current_user.id)
+
+@router.post("/batch", response_model=list[schemas.ABTestOut])
+async def create_batch(tests: list[schemas.ABTestCreate] = Body(..., max_length=schemas.BATCH_MAX_ITEMS),
+                       db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    try:
+        return await crud_async.create_abtests(db, tests, user_id=current_user.id)
+    except InvalidReferences as e:
+        raise HTTPException(status_code=422, detail=e.errors)
 
 @router.get("/", response_model=list[schemas.ABTestOut])
-def read_all(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_abtests(db, user_id=current_user.id)
+async def read_all(page: Page = Depends(paginate(schemas.ABTestOut)), db: DBSession = Depends(get_db),
+                   current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_abtests(db, user_id=current_user.id, **page.query_args()))
+
+@router.get("/creative/{creative_id}", response_model=list[schemas.ABTestOut])
+async def read_by_creative(creative_id: int, page: Page = Depends(paginate(schemas.ABTestOut)),
+                           db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_abtests_by_creative(db, creative_id, user_id=current_user.id, **page.query_args()))
 
 @router.get("/{abtest_id}", response_model=schemas.ABTestOut)
-def read_abtest(abtest_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    abtest = crud.get_abtest_by_id(db, abtest_id, user_id=current_user.id)
+async def read_abtest(abtest_id: int, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    abtest = await crud_async.get_abtest_by_id(db, abtest_id, user_id=current_user.id)
     if abtest is None:
         raise HTTPException(status_code=404, detail="ABTest not found")
     return abtest
+
+@router.get("/{abtest_id}/serve")
+async def serve_variant(abtest_id: int, background_tasks: BackgroundTasks,
+                        policy: bandit.Policy = "thompson", reward: bandit.Reward = "clicks",
+                        epsilon: float = Query(0.1, ge=0, le=1),
+                        db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    arms = bandit.get_arms(abtest_id, current_user.id)
+    if arms is None:
+        arms = await run_db(db, bandit.load, abtest_id, current_user.id)
+        if arms is None:
+            raise HTTPException(status_code=404, detail="Running ABTest not found")
+    elif bandit.is_stale(arms) and not arms.refreshing:
+        arms.refreshing = True
+        background_tasks.add_task(bandit.refresh_in_background, abtest_id)
+    variant_id = arms.choose(policy=policy, reward=reward, epsilon=epsilon)
+    return {"test_id": abtest_id, "variant_id": variant_id, "policy": policy}
+
+@router.get("/{abtest_id}/arms")
+async def read_arms(abtest_id: int, current_user=Depends(get_current_user)):
+    arms = bandit.get_arms(abtest_id, current_user.id)
+    if arms is None:
+        raise HTTPException(status_code=404, detail="No serving state for this ABTest")
+    return {"test_id": abtest_id, "last_performance_id": arms.last_performance_id, "arms": arms.snapshot()}
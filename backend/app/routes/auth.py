@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app import schemas, crud
-from app.db import SessionLocal
+from app import schemas, crud_async, passwords
+from app.cache import MISSING, TTLCache
+from app.db import DBSession, get_db
 from app.models import User
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
@@ -16,17 +16,20 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Resolved users keyed by the token's user_id, so authenticated requests skip
+# the users lookup at steady state. USER_CACHE_TTL=0 disables it. The cache is
+# per process: code that changes a users row must call invalidate_user(), and
+# other workers still serve the old row for up to USER_CACHE_TTL seconds, so a
+# deleted user stays authenticated that long wherever it is cached.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -38,17 +41,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, user.username)
+async def register(user: schemas.UserCreate, db: DBSession = Depends(get_db)):
+    db_user = await crud_async.get_user_by_username(db, user.username, release=True)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    user_obj = crud.create_user(db, user)
+    try:
+        user_obj = await crud_async.create_user(db, user)
+    except passwords.HashingBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins in progress", headers={"Retry-After": "1"})
     return schemas.UserOut(id=user_obj.id, username=user_obj.username)
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: DBSession = Depends(get_db)):
+    user = await crud_async.get_user_by_username(db, form_data.username, release=True)
+    try:
+        authenticated = user is not None and await crud_async.authenticate(db, user, form_data.password)
+    except passwords.HashingBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins in progress", headers={"Retry-After": "1"})
+    if not authenticated:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -56,7 +66,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: DBSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -70,7 +80,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username)
-    if user is None:
+    user = user_cache.get(user_id)
+    if user is not MISSING and user.username == username:
+        return user
+    user = await crud_async.get_user_by_username(db, username)
+    if user is None or user.id != user_id:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    db.expunge(user)  # cached instance must not stay bound to this request's session
+    user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: int):
+    """Drop the cached row for ``user_id`` after changing it."""
+    user_cache.invalidate(user_id) 
\ No newline at end of file
@@ -1,25 +1,31 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app import schemas, crud
-from app.db import SessionLocal
+from fastapi import APIRouter, Body, Depends, HTTPException
+from app import schemas, crud_async
+from app.crud import InvalidReferences
+from app.db import DBSession, get_db
+from app.pagination import Page, paginate
 from typing import List
 from app.routes.auth import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
-
 @router.post("/", response_model=schemas.CreativeOut)
-def create(creative: schemas.CreativeCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.create_creative(db, creative, user_id=current_user.id)
+async def create(creative: schemas.CreativeCreate, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.create_creative(db, creative, user_id=current_user.id)
+
+@router.post("/batch", response_model=list[schemas.CreativeOut])
+async def create_batch(creatives: list[schemas.CreativeCreate] = Body(..., max_length=schemas.BATCH_MAX_ITEMS),
+                       db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    try:
+        return await crud_async.create_creatives(db, creatives, user_id=current_user.id)
+    except InvalidReferences as e:
+        raise HTTPException(status_code=422, detail=e.errors)
 
 @router.get("/product/{product_id}", response_model=list[schemas.CreativeOut])
-def read_by_product(product_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_creatives_by_product(db, product_id, user_id=current_user.id)
+async def read_by_product(product_id: int, page: Page = Depends(paginate(schemas.CreativeOut)),
+                          db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_creatives_by_product(db, product_id, user_id=current_user.id, **page.query_args()))
 
 @router.get("/", response_model=List[schemas.CreativeOut])
-def read_all(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_creatives(db, user_id=current_user.id)
+async def read_all(page: Page = Depends(paginate(schemas.CreativeOut)), db: DBSession = Depends(get_db),
+                   current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_creatives(db, user_id=current_user.id, **page.query_args()))
@@ -1,56 +1,166 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app import schemas, crud
-from app.db import SessionLocal
+import os
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Literal, Optional, Union
+from app import schemas, crud_async, export, ingest, limits, response_cache, simulator, write_buffer
+from app.cache import MISSING, TTLCache
+from app.db import DBSession, get_db, run_db
+from app.pagination import Page, paginate
 from app.routes.auth import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
-
 @router.post("/", response_model=schemas.PerformanceOut)
-def log_data(perf: schemas.PerformanceCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.log_performance(db, perf, user_id=current_user.id)
+async def log_data(perf: schemas.PerformanceCreate, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.log_performance(db, perf, user_id=current_user.id)
+
+# Variants of each test, keyed by (user_id, test_id), so /events can check
+# ownership without a query per request. Variants are fixed at test creation.
+event_references = TTLCache(
+    maxsize=int(os.getenv("EVENT_REFERENCE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("EVENT_REFERENCE_CACHE_TTL", "60")),
+)
+
+async def _check_references(db: DBSession, events, user_id: int):
+    variants = {t: event_references.get((user_id, t)) for t in {e.test_id for e in events}}
+    unknown = [t for t, v in variants.items() if v is MISSING]
+    if unknown:
+        found = await crud_async.variants_by_test(db, unknown, user_id)
+        for test_id in unknown:
+            variants[test_id] = found.get(test_id, set())
+            if test_id in found:  # a test created later must not be refused from cache
+                event_references.set((user_id, test_id), found[test_id])
+    errors = [
+        {"index": i, "error": f"Variant {e.variant_id} is not part of test {e.test_id}"
+         if variants[e.test_id] else f"Test {e.test_id} not found"}
+        for i, e in enumerate(events) if e.variant_id not in variants[e.test_id]
+    ]
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[:100])
+
+@router.post("/events", status_code=202)
+async def enqueue_events(events: Union[schemas.PerformanceCreate, List[schemas.PerformanceCreate]],
+                         db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # Acknowledged once queued; the write buffer inserts them in batches.
+    events = events if isinstance(events, list) else [events]
+    buffer = write_buffer.buffer
+    if len(events) > buffer.maxsize:
+        # Could never fit, even in an empty buffer; retrying would not help.
+        raise HTTPException(status_code=413, detail=f"At most {buffer.maxsize} events per request")
+    await _check_references(db, events, current_user.id)
+    now = datetime.now()
+    rows = [dict(event.dict(), user_id=current_user.id, timestamp=now) for event in events]
+    if not buffer.offer(rows):
+        raise HTTPException(status_code=503, detail="Ingestion buffer is full",
+                            headers={"Retry-After": str(buffer.retry_after())})
+    return {"accepted": len(rows), "pending": len(buffer.pending)}
+
+@router.post("/bulk")
+async def bulk_log_data(request: Request, chunk_size: int = Query(1000, ge=1, le=10000),
+                        db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    parse = ingest.parser_for(request.headers.get("content-type"))
+    if parse is None:
+        raise HTTPException(status_code=415, detail="Send application/json, application/x-ndjson or text/csv")
+    chunks, accepted, rejected = [], 0, 0
+    try:
+        async for records in ingest.chunked(parse(request.stream()), chunk_size):
+            valid, errors = [], []
+            for offset, record in enumerate(records):
+                row = accepted + rejected + offset
+                if isinstance(record, ingest.Unparseable):
+                    errors.append({"row": row, "error": record.error})
+                    continue
+                try:
+                    valid.append(schemas.PerformanceCreate(**record))
+                except (ValidationError, TypeError) as e:
+                    errors.append({"row": row, "error": str(e).splitlines()[0]})
+            try:
+                await crud_async.bulk_log_performance(db, valid, current_user.id)
+            except SQLAlchemyError as e:
+                # Earlier chunks are committed; report them so the client can resume.
+                await run_db(db, lambda session: session.rollback())
+                return JSONResponse(status_code=500, content={
+                    "detail": f"Database error in chunk {len(chunks)}: {type(e).__name__}",
+                    "accepted": accepted, "rejected": rejected, "failed_chunk": len(chunks), "chunks": chunks,
+                })
+            chunks.append({"chunk": len(chunks), "accepted": len(valid), "rejected": len(errors), "errors": errors[:10]})
+            accepted += len(valid)
+            rejected += len(errors)
+    except ingest.MalformedPayload as e:
+        return JSONResponse(status_code=400, content={
+            "detail": str(e), "accepted": accepted, "rejected": rejected, "chunks": chunks,
+        })
+    return {"accepted": accepted, "rejected": rejected, "chunks": chunks}
 
 @router.get("/test/{test_id}", response_model=list[schemas.PerformanceOut])
-def get_by_test(test_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_performance_by_test(db, test_id, user_id=current_user.id)
+async def get_by_test(test_id: int, page: Page = Depends(paginate(schemas.PerformanceOut)),
+                      db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_performance_by_test(db, test_id, user_id=current_user.id, **page.query_args()))
 
-import random
-from datetime import datetime
+@router.get("/export", dependencies=[Depends(limits.guard("export"))])
+def export_data(format: export.Format = "csv", test_id: Optional[int] = None, product_id: Optional[int] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                batch_size: int = Query(10000, ge=100, le=100000), current_user=Depends(get_current_user)):
+    if format != "csv" and not export.arrow_available():
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+    query = export.build_query(current_user.id, test_id=test_id, product_id=product_id, start=start, end=end)
+    return StreamingResponse(
+        export.stream(format, query, batch_size),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="performance.{format}"'},
+    )
 
-@router.post("/simulate/{test_id}")
-def simulate_performance(test_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    from app.models import ABTest, Creative
-    test = db.query(ABTest).filter(ABTest.id == test_id, ABTest.user_id == current_user.id).first()
-    if not test:
+@router.post("/simulate/{test_id}", dependencies=[Depends(limits.guard("simulate"))])
+async def simulate_performance(test_id: int, hours: Optional[int] = Query(None, ge=1, le=24 * 366),
+                               impressions_per_hour: float = Query(1000, gt=0, le=1_000_000),
+                               seasonality: float = Query(0.3, ge=0, le=1), seed: Optional[int] = None,
+                               db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # Without hours: one random row per variant, as before. With hours: the
+    # vectorised simulator bulk-loads a full hourly history and returns a summary.
+    if hours is None:
+        data = await crud_async.simulate_performance(db, test_id, user_id=current_user.id)
+    else:
+        data = await run_db(db, simulator.simulate_test, test_id, current_user.id, hours=hours,
+                            impressions_per_hour=impressions_per_hour, seasonality=seasonality, seed=seed)
+    if data is None:
         return {"error": "Test not found"}
-    variant_ids = list(map(int, test.variant_ids.split(',')))
-    data = []
-    for vid in variant_ids:
-        impressions = random.randint(100, 1000)
-        clicks = random.randint(0, impressions)
-        conversions = random.randint(0, clicks)
-        record = schemas.PerformanceCreate(
-            test_id=test_id,
-            variant_id=vid,
-            impressions=impressions,
-            clicks=clicks,
-            conversions=conversions,
-        )
-        data.append(crud.log_performance(db, record, user_id=current_user.id))
     return data
 
 @router.get("/metrics")
-def get_metrics(product_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.calculate_metrics(product_id, db, user_id=current_user.id)
+async def get_metrics(response: Response, product_id: int, test_id: Optional[int] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    filters = {"test_id": test_id, "start": start, "end": end}
+    return await response_cache.cached(
+        "metrics", current_user.id, dict(filters, product_id=product_id), [response_cache.tag("product", product_id)],
+        lambda: limits.admitted("analytics", current_user.id,
+                                lambda: crud_async.calculate_metrics(product_id, db, user_id=current_user.id, **filters)),
+        response,
+    )
+
+@router.get("/timeseries/{test_id}", dependencies=[Depends(limits.guard("analytics"))])
+async def get_timeseries(test_id: int, bucket: Literal["hour", "day", "week"] = "day",
+                         start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         max_points: int = Query(1000, ge=10, le=10000),
+                         db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # Buckets beyond max_points per variant are coarsened (hour -> day -> week).
+    data = await crud_async.get_timeseries(db, test_id, current_user.id, bucket=bucket, start=start, end=end,
+                                           max_points=max_points)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Test not found")
+    return data
 
 @router.get("/suggest/{abtest_id}")
-def suggest_best_creative_route(abtest_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    result = crud.suggest_best_creative(db, abtest_id, user_id=current_user.id)
+async def suggest_best_creative_route(abtest_id: int, response: Response, db: DBSession = Depends(get_db),
+                                     current_user=Depends(get_current_user)):
+    result = await response_cache.cached(
+        "suggest", current_user.id, {"test_id": abtest_id}, [response_cache.tag("test", abtest_id)],
+        lambda: limits.admitted("analytics", current_user.id,
+                                lambda: crud_async.suggest_best_creative(db, abtest_id, user_id=current_user.id)),
+        response,
+    )
     if not result:
         return {"message": "No creatives found or no performance data available."}
     return result
@@ -1,24 +1,25 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app import schemas, crud
-from app.db import SessionLocal
+from fastapi import APIRouter, Body, Depends
+from app import schemas, crud_async
+from app.db import DBSession, get_db
+from app.pagination import Page, paginate
 from app.routes.auth import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
-
 @router.post("/", response_model=schemas.ProductOut)
-def create(product: schemas.ProductCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.create_product(db, product, user_id=current_user.id)
+async def create(product: schemas.ProductCreate, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.create_product(db, product, user_id=current_user.id)
+
+@router.post("/batch", response_model=list[schemas.ProductOut])
+async def create_batch(products: list[schemas.ProductCreate] = Body(..., max_length=schemas.BATCH_MAX_ITEMS),
+                       db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.create_products(db, products, user_id=current_user.id)
 
 @router.get("/", response_model=list[schemas.ProductOut])
-def read_all(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_products(db, user_id=current_user.id)
+async def read_all(page: Page = Depends(paginate(schemas.ProductOut)), db: DBSession = Depends(get_db),
+                   current_user=Depends(get_current_user)):
+    return page.respond(await crud_async.get_products(db, user_id=current_user.id, **page.query_args()))
 
 @router.get("/{product_id}", response_model=schemas.ProductOut)
-def read_one(product_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return crud.get_product(db, product_id, user_id=current_user.id)
+async def read_one(product_id: int, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud_async.get_product(db, product_id, user_id=current_user.id)
@@ -0,0 +1,41 @@
+from datetime import date
+from typing import List, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from app import analytics, limits
+from app.db import DBSession, get_db, run_db
+from app.routes.auth import get_current_user
+
+router = APIRouter(dependencies=[Depends(limits.guard("analytics"))])
+
+async def _snapshot(background_tasks: BackgroundTasks, db: DBSession, user_id: int):
+    # Served from memory; only the first report for a user loads from the database.
+    snapshot = analytics.get_snapshot(user_id)
+    if snapshot is None:
+        snapshot = await run_db(db, analytics.load, user_id)
+    elif analytics.is_stale(snapshot) and not snapshot.refreshing:
+        snapshot.refreshing = True
+        background_tasks.add_task(analytics.refresh_in_background, user_id)
+    return snapshot
+
+@router.get("/rank")
+async def rank(background_tasks: BackgroundTasks, metric: analytics.Metric = "ctr", group_by: analytics.GroupBy = "creative",
+               product_id: Optional[List[int]] = Query(None), test_id: Optional[List[int]] = Query(None),
+               start: Optional[date] = None, end: Optional[date] = None, min_impressions: int = Query(0, ge=0),
+               order: Literal["desc", "asc"] = "desc", limit: int = Query(50, ge=1, le=1000),
+               db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    snapshot = await _snapshot(background_tasks, db, current_user.id)
+    results = snapshot.rank(metric=metric, group_by=group_by, product_ids=product_id, test_ids=test_id, start=start,
+                            end=end, min_impressions=min_impressions, descending=order == "desc", limit=limit)
+    return {"metric": metric, "group_by": group_by, "snapshot": snapshot.describe(), "results": results}
+
+@router.get("/compare")
+async def compare(background_tasks: BackgroundTasks, creative_id: List[int] = Query(..., min_length=2, max_length=50),
+                  metric: Literal["ctr", "cvr"] = "ctr", start: Optional[date] = None, end: Optional[date] = None,
+                  daily: bool = False, db: DBSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # The first creative is the baseline for lift and z-scores.
+    snapshot = await _snapshot(background_tasks, db, current_user.id)
+    unknown = [c for c in creative_id if c not in snapshot.creatives]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"No performance data for creatives {unknown}")
+    results = snapshot.compare(creative_id, metric=metric, start=start, end=end, daily=daily)
+    return {"metric": metric, "baseline": creative_id[0], "snapshot": snapshot.describe(), "results": results}
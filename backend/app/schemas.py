@@ -1,7 +1,11 @@
+import os
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 
+# Upper bound on items per POST /products|creatives|tests/batch request.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -0,0 +1,150 @@
+import argparse
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+# Synthetic performance data at production volume. Counts are drawn with
+# NumPy per (hour, variant): impressions are Poisson around a base rate
+# shaped by a daily cycle, clicks and conversions are binomial on each
+# variant's true CTR and CVR. Rows are bulk-loaded in batches through
+# crud.insert_performance_rows, so rollups stay in step with raw rows.
+
+
+def true_rates(n_variants: int, rng, ctr=(0.01, 0.05), cvr=(0.02, 0.10)):
+    return rng.uniform(*ctr, n_variants), rng.uniform(*cvr, n_variants)
+
+
+def generate(variant_ids, hours: int, start: datetime, impressions_per_hour: float, ctr, cvr,
+             seasonality: float = 0.3, rng=None, batch_size: int = 50000):
+    """Yield lists of row dicts (without test_id/user_id) covering ``hours`` hours."""
+    rng = rng if rng is not None else np.random.default_rng()
+    variant_ids = np.asarray(variant_ids, dtype=np.int64)
+    k = len(variant_ids)
+    ctr = np.asarray(ctr, dtype=np.float64)
+    cvr = np.asarray(cvr, dtype=np.float64)
+    hours_per_batch = max(1, batch_size // max(k, 1))
+    for first in range(0, hours, hours_per_batch):
+        offsets = np.arange(first, min(first + hours_per_batch, hours))
+        hour_of_day = (start.hour + offsets) % 24
+        # Daily cycle: traffic peaks mid-afternoon and bottoms out at night.
+        shape = 1 + seasonality * np.sin(2 * math.pi * (hour_of_day - 9) / 24)
+        impressions = rng.poisson(impressions_per_hour * shape[:, None], size=(len(offsets), k))
+        clicks = rng.binomial(impressions, ctr[None, :])
+        conversions = rng.binomial(clicks, cvr[None, :])
+        timestamps = [start + timedelta(hours=int(h)) for h in offsets]
+        yield [
+            {
+                "variant_id": int(variant_ids[j]),
+                "impressions": int(impressions[i, j]),
+                "clicks": int(clicks[i, j]),
+                "conversions": int(conversions[i, j]),
+                "timestamp": timestamps[i],
+            }
+            for i in range(len(offsets))
+            for j in range(k)
+        ]
+
+
+def load(db: Session, test_id: int, user_id: int, variant_ids, hours: int, start: datetime = None,
+         impressions_per_hour: float = 1000, seasonality: float = 0.3, seed: int = None, batch_size: int = 50000):
+    """Generate and bulk-load rows for one test. Returns a summary dict."""
+    rng = np.random.default_rng(seed)
+    ctr, cvr = true_rates(len(variant_ids), rng)
+    start = start or (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    rows = batches = 0
+    for batch in generate(variant_ids, hours, start, impressions_per_hour, ctr, cvr, seasonality, rng, batch_size):
+        for row in batch:
+            row["test_id"] = test_id
+            row["user_id"] = user_id
+        rows += crud.insert_performance_rows(db, batch)
+        batches += 1
+    return {
+        "test_id": test_id,
+        "rows": rows,
+        "batches": batches,
+        "start": start,
+        "hours": hours,
+        "variants": [
+            {"variant_id": int(v), "true_ctr": round(float(a), 4), "true_cvr": round(float(b), 4)}
+            for v, a, b in zip(variant_ids, ctr, cvr)
+        ],
+    }
+
+
+def simulate_test(db: Session, test_id: int, user_id: int, **params):
+    test = db.query(models.ABTest).filter(models.ABTest.id == test_id, models.ABTest.user_id == user_id).first()
+    if not test or not test.variant_ids_list:
+        return None
+    return load(db, test_id, user_id, test.variant_ids_list, **params)
+
+
+def seed_database(db: Session, users=1, products=2, creatives=10, tests=1, hours=24 * 30,
+                  impressions_per_hour=1000, password="password", seed=42, batch_size=50000):
+    """Create users, products, creatives and tests, then load simulated traffic."""
+    hashed = crud.get_password_hash(password)
+    summary = {"users": [], "rows": 0}
+    for u in range(users):
+        user = models.User(username=f"sim-user-{u}-{seed}", hashed_password=hashed)
+        db.add(user)
+        db.flush()
+        for _ in range(products):
+            product = models.Product(title="Simulated product", description="", images="", user_id=user.id)
+            db.add(product)
+            db.flush()
+            batch = [
+                models.Creative(product_id=product.id, image_url="", headline=f"Variant {i}", description="", user_id=user.id)
+                for i in range(creatives)
+            ]
+            db.add_all(batch)
+            db.flush()
+            for _ in range(tests):
+                test = models.ABTest(product_id=product.id, user_id=user.id)
+                test.variants = [models.ABTestVariant(creative_id=c.id, position=i) for i, c in enumerate(batch)]
+                db.add(test)
+                db.commit()
+                result = load(db, test.id, user.id, [c.id for c in batch], hours=hours,
+                              impressions_per_hour=impressions_per_hour, seed=seed + test.id, batch_size=batch_size)
+                summary["rows"] += result["rows"]
+        summary["users"].append({"id": user.id, "username": user.username})
+    return summary
+
+
+def main():
+    from .db import SessionLocal, get_engine
+    from .migrations import init_schema
+
+    parser = argparse.ArgumentParser(prog="python -m app.simulator", description="Seed the database with simulated traffic.")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--products", type=int, default=2)
+    parser.add_argument("--creatives", type=int, default=10, help="creatives (variants) per product")
+    parser.add_argument("--tests", type=int, default=1, help="A/B tests per product")
+    parser.add_argument("--hours", type=int, default=24 * 30, help="hours of traffic per test")
+    parser.add_argument("--impressions", type=float, default=1000, help="mean impressions per variant per hour")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    init_schema(get_engine())
+    db = SessionLocal()
+    try:
+        started = datetime.now()
+        summary = seed_database(
+            db, users=args.users, products=args.products, creatives=args.creatives, tests=args.tests,
+            hours=args.hours, impressions_per_hour=args.impressions, password=args.password,
+            seed=args.seed, batch_size=args.batch_size,
+        )
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"✅ Seeded {summary['rows']} performance rows in {elapsed:.1f}s ({summary['rows'] / max(elapsed, 1e-9):.0f} rows/s).")
+        for user in summary["users"]:
+            print(f"   user {user['username']} (id {user['id']}), password {args.password!r}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
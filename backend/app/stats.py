@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+# Winner selection for A/B tests: Beta-Binomial posteriors (Monte Carlo win
+# probabilities), two-proportion z-tests against the leader and a mixture
+# SPRT stopping boundary that stays valid when results are checked
+# continuously. Everything is vectorised over variants.
+
+DRAW_BUDGET = 50_000    # Monte Carlo draws per call, split across candidate arms
+MIN_SAMPLES, MAX_SAMPLES = 1000, 10_000
+NORMAL_APPROX_MIN = 30  # Beta(a, b) sampled as a normal once both a and b reach this
+PRUNE_SD = 6.0          # arms this many sds below the leader cannot win
+
+
+def posterior_params(successes, trials, prior=(1.0, 1.0)):
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    return successes + prior[0], trials - successes + prior[1]
+
+
+def win_probabilities(alpha, beta, samples=None, rng=None):
+    """P(arm has the highest rate) for each arm, by Monte Carlo on the posteriors."""
+    # Fixed default seed: identical counts always give identical answers.
+    rng = rng if rng is not None else np.random.default_rng(0)
+    k = len(alpha)
+    if k == 0:
+        return np.zeros(0)
+    total = alpha + beta
+    mean = alpha / total
+    sd = np.sqrt(alpha * beta / (total * total * (total + 1)))
+    leader = int(np.argmax(mean))
+    # Arms that cannot plausibly overtake the leader keep probability 0 and
+    # are never sampled, which keeps the cost flat for tests with many losers.
+    candidates = np.flatnonzero(mean + PRUNE_SD * sd >= mean[leader] - PRUNE_SD * sd[leader])
+    if len(candidates) == 1:
+        probs = np.zeros(k)
+        probs[leader] = 1.0
+        return probs
+    if samples is None:
+        samples = int(np.clip(DRAW_BUDGET // len(candidates), MIN_SAMPLES, MAX_SAMPLES))
+    a, b = alpha[candidates], beta[candidates]
+    draws = np.empty((samples, len(candidates)), dtype=np.float32)
+    normal = (a >= NORMAL_APPROX_MIN) & (b >= NORMAL_APPROX_MIN)
+    if normal.any():
+        noise = rng.standard_normal((samples, int(normal.sum())), dtype=np.float32)
+        draws[:, normal] = mean[candidates][normal] + sd[candidates][normal] * noise
+    if (~normal).any():
+        draws[:, ~normal] = rng.beta(a[~normal], b[~normal], size=(samples, int((~normal).sum())))
+    wins = np.bincount(draws.argmax(axis=1), minlength=len(candidates))
+    probs = np.zeros(k)
+    probs[candidates] = wins / samples
+    return probs
+
+
+def z_tests(successes, trials, reference: int):
+    """Pooled two-proportion z-score and two-sided p-value of reference vs each arm."""
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(trials > 0, successes / trials, 0.0)
+        pooled = (successes[reference] + successes) / (trials[reference] + trials)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / trials[reference] + 1 / trials))
+        z = np.where(se > 0, (rate[reference] - rate) / se, 0.0)
+    z[reference] = 0.0
+    p = np.array([math.erfc(abs(v) / math.sqrt(2)) for v in z])
+    return z, p
+
+
+def msprt_boundary(successes, trials, reference: int, alpha=0.05, tau=0.01):
+    """Critical |z| for a normal-mixture SPRT on the rate difference vs reference.
+
+    The test stops when the mixture likelihood ratio reaches 1/alpha; in z
+    units that is z^2 >= (V + tau^2)/tau^2 * (2 log(1/alpha) + log((V + tau^2)/V)),
+    where V is the variance of the observed difference and tau the prior sd
+    of the true difference. The boundary shrinks as data accumulates.
+    """
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(trials > 0, successes / trials, 0.0)
+        var = rate * (1 - rate) / trials
+        v = var[reference] + var
+        tau2 = tau * tau
+        boundary = np.sqrt((v + tau2) / tau2 * (2 * math.log(1 / alpha) + np.log((v + tau2) / v)))
+    boundary = np.where(np.isfinite(boundary), boundary, np.inf)
+    boundary[reference] = 0.0
+    return boundary
+
+
+def analyze(successes, trials, confidence=0.95, alpha=0.05, tau=0.01, samples=None, rng=None):
+    """Pick a winner and report whether the evidence for it is conclusive."""
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    a, b = posterior_params(successes, trials)
+    win = win_probabilities(a, b, samples=samples, rng=rng)
+    leader = int(np.argmax(win))
+    z, p = z_tests(successes, trials, leader)
+    boundary = msprt_boundary(successes, trials, leader, alpha=alpha, tau=tau)
+    others = np.arange(len(trials)) != leader
+    crossed = bool(np.all(z[others] >= boundary[others])) if others.any() else False
+    return {
+        "leader": leader,
+        "confidence": float(win[leader]),
+        "conclusive": bool(win[leader] >= confidence and crossed),
+        "win_probability": win,
+        "z_score": z,
+        "p_value": p,
+        "boundary_z": boundary,
+    }
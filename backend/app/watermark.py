@@ -0,0 +1,36 @@
+import os
+import time
+from collections import deque
+
+# Incremental readers (bandit arms, analytics snapshots) fold performance rows
+# in by id. max(id) alone is not a safe watermark: a transaction can commit a
+# lower id after a higher one is already visible, and rows behind the
+# watermark would be skipped for good. Readers therefore keep two parts:
+# "settled" totals for ids up to settled_id, and a window (id > settled_id)
+# that is re-aggregated on every refresh. An id is settled once it was
+# already visible COMMIT_GRACE_SECONDS ago, so any transaction holding a lower
+# id has had that long to commit; one that takes longer is missed.
+
+COMMIT_GRACE_SECONDS = float(os.getenv("COMMIT_GRACE_SECONDS", "30"))
+
+
+class Watermark:
+    def __init__(self, grace: float = None, clock=time.monotonic):
+        self.grace = COMMIT_GRACE_SECONDS if grace is None else grace
+        self.settled_id = 0
+        self.high_id = 0
+        self._clock = clock
+        self._seen = deque()  # (time, highest id visible then)
+
+    def settle(self):
+        """Id the settled part may advance to now (>= settled_id)."""
+        cutoff = self._clock() - self.grace
+        target = self.settled_id
+        while self._seen and self._seen[0][0] <= cutoff:
+            target = max(target, self._seen.popleft()[1])
+        return target
+
+    def seen(self, high_id: int):
+        """Record the highest id visible at this refresh."""
+        self.high_id = max(self.high_id, high_id or 0)
+        self._seen.append((self._clock(), self.high_id))
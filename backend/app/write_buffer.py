@@ -0,0 +1,304 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import exc
+
+from . import crud
+from .db import SessionLocal
+
+# Errors caused by the rows themselves (bad foreign key, out-of-range value),
+# as opposed to the database being unavailable. COPY on psycopg2 raises the
+# driver's exceptions unwrapped.
+DATA_ERRORS = (exc.IntegrityError, exc.DataError)
+try:
+    import psycopg2
+    DATA_ERRORS += (psycopg2.IntegrityError, psycopg2.DataError)
+except ImportError:
+    pass
+
+# Write-behind buffer for POST /performance/events. Events are acknowledged
+# once they are queued (and appended to the journal, if one is configured);
+# a background task inserts them in batches through
+# crud.insert_performance_rows, so rollups and cache invalidation behave as
+# for any other ingestion path.
+#
+# The journal is NDJSON with a sequence number per event, plus a
+# "<journal>.checkpoint" file holding the last sequence number committed to
+# the database. On startup, journaled events past the checkpoint are queued
+# again. Delivery is at-least-once: a crash between a commit and the
+# checkpoint write replays that batch. Use one journal file per process. The
+# journal is rewritten with only the still-queued events once it outgrows
+# WRITE_BUFFER_COMPACT_BYTES, so it stays bounded under steady load.
+#
+# A batch that fails because of its data (integrity or data errors) is split
+# in halves until the offending events are isolated; those go to a
+# dead-letter queue (kept in memory, and appended to "<journal>.dead" when
+# journaling) and the rest is inserted. Other errors, such as a lost
+# connection, leave the batch at the head of the queue to be retried.
+#
+# WRITE_BUFFER_SIZE      max queued events before /events answers 503 (10000)
+# WRITE_BUFFER_BATCH     events per INSERT batch (1000)
+# WRITE_BUFFER_FLUSH_MS  flush at least this often when events are queued (200)
+# WRITE_BUFFER_JOURNAL   journal path; unset keeps the queue in memory only
+# WRITE_BUFFER_FSYNC=1   fsync the journal on every append (slower, survives power loss)
+# WRITE_BUFFER_COMPACT_BYTES  journal size that triggers compaction (8 MiB)
+# WRITE_BUFFER_DEAD_LETTERS   dead-lettered events kept in memory (1000)
+
+
+class WriteBuffer:
+    def __init__(self, maxsize=10000, batch_size=1000, flush_interval=0.2, journal_path=None,
+                 fsync=False, flush_fn=None, compact_bytes=8 << 20, dead_letter_size=1000):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.flush_fn = flush_fn or _insert_rows
+        self.compact_bytes = compact_bytes
+        self.pending = deque()  # (enqueued_at, seq, row)
+        self.dead_letters = deque(maxlen=dead_letter_size)  # (seq, row, error)
+        self.seq = 0
+        self.accepted = self.rejected = self.flushed = self.dead_lettered = 0
+        self.batches = self.errors = self.replayed = self.compactions = 0
+        self.last_batch_lag = self.last_flush_seconds = 0.0
+        self._journal = None
+        self._wake = None
+        self._task = None
+        self._stopping = False
+
+    # -- producer side (event loop thread) ---------------------------------
+
+    def offer(self, rows):
+        """Queue rows for insertion. Returns False, queuing nothing, when full."""
+        if len(self.pending) + len(rows) > self.maxsize:
+            self.rejected += len(rows)
+            return False
+        now = time.monotonic()
+        lines = []
+        for row in rows:
+            self.seq += 1
+            self.pending.append((now, self.seq, row))
+            if self._journal is not None:
+                lines.append(_line(self.seq, row))
+        if lines:
+            self._journal.write("\n".join(lines) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+        self.accepted += len(rows)
+        if self._wake is not None and len(self.pending) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def retry_after(self):
+        # Seconds until enough batches have gone out to free the whole buffer.
+        return max(1, math.ceil(self.flush_interval * len(self.pending) / self.batch_size))
+
+    # -- journal -----------------------------------------------------------
+
+    def _checkpoint_path(self):
+        return self.journal_path + ".checkpoint"
+
+    def _read_checkpoint(self):
+        try:
+            with open(self._checkpoint_path()) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, seq):
+        tmp = self._checkpoint_path() + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(seq))
+        os.replace(tmp, self._checkpoint_path())
+
+    def recover(self):
+        """Queue journaled events the database has not seen, then open the journal for appends."""
+        if not self.journal_path:
+            return 0
+        checkpoint = self._read_checkpoint()
+        self.seq = checkpoint
+        replayed = []
+        torn = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn write from a crash mid-append
+                    seq = event.pop("seq")
+                    self.seq = max(self.seq, seq)
+                    if seq > checkpoint:
+                        event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+                        replayed.append((seq, event))
+        now = time.monotonic()
+        self.pending.extend((now, seq, row) for seq, row in replayed)
+        self.replayed += len(replayed)
+        self._journal = open(self.journal_path, "a")
+        if torn:
+            self._journal.write("\n")  # keep new appends off the torn line
+        if replayed:
+            print(f"♻️ Replaying {len(replayed)} journaled performance events")
+        return len(replayed)
+
+    def _compact(self):
+        # Keep only events past the checkpoint: truncate when nothing is
+        # queued, otherwise rewrite once the file has grown large enough.
+        if self._journal is None:
+            return
+        if not self.pending:
+            self._journal.close()
+            self._journal = open(self.journal_path, "w")
+            return
+        if self._journal.tell() < self.compact_bytes:
+            return
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w") as f:
+            for _, seq, row in self.pending:
+                f.write(_line(seq, row) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp, self.journal_path)
+        self._journal = open(self.journal_path, "a")
+        self.compactions += 1
+
+    def _dead_letter(self, item, error):
+        _, seq, row = item
+        message = f"{type(error).__name__}: {str(error).splitlines()[0] if str(error) else ''}"
+        self.dead_letters.append((seq, row, message))
+        self.dead_lettered += 1
+        if self.journal_path:
+            with open(self.journal_path + ".dead", "a") as f:
+                f.write(json.dumps(dict(row, seq=seq, timestamp=row["timestamp"].isoformat(), error=message)) + "\n")
+        print(f"☠️ Dead-lettered performance event {seq}: {message}")
+
+    # -- consumer side -----------------------------------------------------
+
+    async def flush_once(self):
+        if not self.pending:
+            return 0
+        batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+        started = time.monotonic()
+        segments = deque([batch])  # still to insert, in sequence order
+        handled = None  # last event inserted or dead-lettered
+        try:
+            while segments:
+                segment = segments[0]
+                try:
+                    await asyncio.to_thread(self.flush_fn, [row for _, _, row in segment])
+                    self.flushed += len(segment)
+                except DATA_ERRORS as e:
+                    if len(segment) > 1:
+                        mid = len(segment) // 2
+                        segments[0] = segment[mid:]
+                        segments.appendleft(segment[:mid])
+                        continue
+                    self._dead_letter(segment[0], e)
+                segments.popleft()
+                handled = segment[-1]
+        except Exception:
+            self.errors += 1
+            self.pending.extendleft(reversed([item for segment in segments for item in segment]))
+            raise
+        finally:
+            if handled is not None and self.journal_path:
+                self._write_checkpoint(handled[1])
+                self._compact()
+        done = time.monotonic()
+        self.batches += 1
+        self.last_flush_seconds = done - started
+        self.last_batch_lag = done - batch[0][0]
+        return len(batch)
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # One batch per tick (size or time threshold), more while full batches remain.
+                while self.pending:
+                    await self.flush_once()
+                    if len(self.pending) < self.batch_size:
+                        break
+                backoff = self.flush_interval
+            except Exception as e:
+                print(f"⚠️ Write buffer flush failed ({e}); retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def start(self):
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=30.0):
+        """Stop the worker and flush what is queued, within ``timeout`` seconds."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            try:
+                await self.flush_once()
+            except Exception as e:
+                print(f"⚠️ Write buffer drain failed ({e}); {len(self.pending)} events left in the journal")
+                break
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def stats(self):
+        return {
+            "accepted_total": self.accepted,
+            "rejected_total": self.rejected,
+            "flushed_total": self.flushed,
+            "dead_lettered_total": self.dead_lettered,
+            "journal_compactions_total": self.compactions,
+            "replayed_total": self.replayed,
+            "flush_batches_total": self.batches,
+            "flush_errors_total": self.errors,
+            "pending": len(self.pending),
+            "capacity": self.maxsize,
+            "lag_seconds": time.monotonic() - self.pending[0][0] if self.pending else 0.0,
+            "last_batch_lag_seconds": self.last_batch_lag,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+
+def _line(seq, row):
+    return json.dumps(dict(row, seq=seq, timestamp=row["timestamp"].isoformat()))
+
+
+def _insert_rows(rows):
+    db = SessionLocal()
+    try:
+        crud.insert_performance_rows(db, rows)
+    finally:
+        db.close()
+
+
+buffer = WriteBuffer(
+    maxsize=int(os.getenv("WRITE_BUFFER_SIZE", "10000")),
+    batch_size=int(os.getenv("WRITE_BUFFER_BATCH", "1000")),
+    flush_interval=float(os.getenv("WRITE_BUFFER_FLUSH_MS", "200")) / 1000,
+    journal_path=os.getenv("WRITE_BUFFER_JOURNAL") or None,
+    fsync=os.getenv("WRITE_BUFFER_FSYNC", "").lower() in ("1", "true", "yes"),
+    compact_bytes=int(os.getenv("WRITE_BUFFER_COMPACT_BYTES", str(8 << 20))),
+    dead_letter_size=int(os.getenv("WRITE_BUFFER_DEAD_LETTERS", "1000")),
+)
@@ -0,0 +1,5 @@
+import os
+
+# Benchmarks run against a throwaway SQLite file unless DATABASE_URL says otherwise.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
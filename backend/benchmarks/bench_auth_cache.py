@@ -0,0 +1,48 @@
+"""Requests/second on GET /creatives/ with and without the user cache.
+
+Run from backend/:  python -m benchmarks.bench_auth_cache --requests 2000
+"""
+import argparse
+import time
+
+from benchmarks.client import authed_client
+from benchmarks.seed import reset_schema
+from app.cache import TTLCache
+from app.routes import auth
+
+
+def requests_per_second(client, headers, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        assert client.get("/creatives/", headers=headers).status_code == 200
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--creatives", type=int, default=20)
+    args = parser.parse_args()
+
+    reset_schema()
+    client, headers = authed_client()
+    product = client.post("/products/", json={"title": "p", "description": "d", "images": ["a.png"]}, headers=headers).json()
+    for _ in range(args.creatives):
+        client.post("/creatives/", json={
+            "product_id": product["id"], "image_url": "i", "headline": "h", "description": "d",
+        }, headers=headers)
+
+    cached = auth.user_cache
+    auth.user_cache = TTLCache(maxsize=0, ttl=0)
+    uncached_rps = requests_per_second(client, headers, args.requests)
+    auth.user_cache = cached
+    cached_rps = requests_per_second(client, headers, args.requests)
+
+    print(f"GET /creatives/ x{args.requests}")
+    print(f"without user cache: {uncached_rps:8.1f} req/s")
+    print(f"with user cache   : {cached_rps:8.1f} req/s  ({cached_rps / uncached_rps:.2f}x)")
+    print(f"cache stats       : {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Regret and decision throughput of the traffic-allocation policies.
+
+Run from backend/:  python -m benchmarks.bench_bandit --arms 10 --rounds 20000
+
+Arms are Bernoulli with fixed click-through rates; each round the policy
+picks an arm, one impression is shown and the outcome is fed back through
+TestArms.observe, exactly as refreshed counters would be.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.bandit import POLICIES, TestArms
+
+
+def run(policy, ctrs, rounds, seed):
+    rng = np.random.default_rng(seed)
+    arms = TestArms(test_id=0, user_id=0, variant_ids=list(range(len(ctrs))))
+    best = ctrs.max()
+    regret = 0.0
+    decide_time = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        arm = arms.choose(policy=policy, rng=rng)
+        decide_time += time.perf_counter() - start
+        arms.observe(arm, impressions=1, clicks=int(rng.random() < ctrs[arm]))
+        regret += best - ctrs[arm]
+    return regret, rounds / decide_time, arms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arms", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    ctrs = np.random.default_rng(args.seed).uniform(0.01, 0.05, args.arms)
+    print(f"arms={args.arms} rounds={args.rounds} best ctr={ctrs.max():.4f}  uniform split regret={args.rounds * (ctrs.max() - ctrs.mean()):.1f}")
+    for policy in POLICIES:
+        regret, dps, arms = run(policy, ctrs, args.rounds, args.seed)
+        share = arms.impressions[int(np.argmax(ctrs))] / args.rounds
+        print(f"{policy:9} regret={regret:8.1f}  best-arm share={share:6.1%}  {dps:10.0f} decisions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Tail latency of a well-behaved tenant while another one hammers the analytics endpoints.
+
+Run from backend/:  python -m benchmarks.bench_limits --abusers 64 --abuse-rps 200 --seconds 10
+
+Both tenants own a product with a simulated history. The probe tenant asks
+for /performance/metrics every 250 ms, within its rate limit. The abusive
+tenant runs concurrent loops against the same endpoint, ignoring
+Retry-After and varying ``start`` so every request misses the response
+cache. The client shares the process (and CPU) with the app, so its offered
+load is capped at --abuse-rps rather than unbounded; that is still far above
+the abuser's rate limit. Phases: no abuse, abuse with limits disabled (the
+old behaviour) and abuse with the default rate limits and bulkheads.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.seed import reset_schema
+from app import limits, passwords
+from app.main import app
+
+EPOCH = datetime(2020, 1, 1)
+_offsets = itertools.count()
+
+
+def metrics_url(product_id):
+    # A distinct start per request defeats the response cache without changing the result.
+    return f"/performance/metrics?product_id={product_id}&start={(EPOCH + timedelta(seconds=next(_offsets))).isoformat()}"
+
+
+async def tenant(client, name, hours):
+    await client.post("/auth/register", json={"username": name, "password": "bench-password"})
+    token = (await client.post("/auth/login", data={"username": name, "password": "bench-password"})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    product = (await client.post("/products/", json={"title": "p", "description": "d", "images": ["a.png"]}, headers=headers)).json()
+    creatives = (await client.post("/creatives/batch", json=[
+        {"product_id": product["id"], "image_url": "i", "headline": f"h{i}", "description": "d"} for i in range(5)
+    ], headers=headers)).json()
+    test = (await client.post("/tests/", json={"product_id": product["id"], "variant_ids": [c["id"] for c in creatives]},
+                              headers=headers)).json()
+    await client.post(f"/performance/simulate/{test['id']}?hours={hours}&seed=1", headers=headers)
+    return headers, product["id"]
+
+
+async def probe(client, headers, product_id, until):
+    samples, counts = [], {}
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        status = (await client.get(metrics_url(product_id), headers=headers)).status_code
+        samples.append((time.perf_counter() - start) * 1000)
+        counts[status] = counts.get(status, 0) + 1
+        await asyncio.sleep(0.25)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))], counts
+
+
+async def abuse_loop(client, headers, product_id, until, counts, interval):
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        status = (await client.get(metrics_url(product_id), headers=headers)).status_code
+        counts[status] = counts.get(status, 0) + 1
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+async def phase(client, probe_tenant, abuse_tenant, seconds, abusers, rps):
+    until = time.perf_counter() + seconds
+    counts = {}
+    loops = [asyncio.create_task(abuse_loop(client, *abuse_tenant, until, counts, abusers / rps)) for _ in range(abusers)]
+    p50, p99, probe_counts = await probe(client, *probe_tenant, until)
+    await asyncio.gather(*loops)
+    return p50, p99, probe_counts, counts
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        passwords.configure(rounds=4)
+        limits.limiter.enabled = False
+        probe_tenant = await tenant(client, "probe", args.hours)
+        abuse_tenant = await tenant(client, "abuser", args.hours)
+
+        print(f"GET /performance/metrics latency for the probe tenant, {args.abusers} abusive loops "
+              f"offering {args.abuse_rps} req/s, {args.hours}h history")
+        for label, abusers, enabled in (("no abuse", 0, False), ("abuse, no limits", args.abusers, False),
+                                        ("abuse, limits", args.abusers, True)):
+            limiter = limits.configure(limits.from_env())
+            limiter.enabled = enabled
+            p50, p99, probe_counts, counts = await phase(client, probe_tenant, abuse_tenant, args.seconds, abusers,
+                                                         args.abuse_rps)
+            print(f"  {label:17} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  probe {probe_counts}  abuser {counts or '-'}")
+        passwords.hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--abusers", type=int, default=64, help="concurrent request loops of the abusive tenant")
+    parser.add_argument("--abuse-rps", type=float, default=200, help="total request rate the abusive loops aim for")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--hours", type=int, default=24 * 30, help="simulated history per tenant")
+    args = parser.parse_args()
+    reset_schema()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Latency of GET /creatives/ while a storm of concurrent logins is running.
+
+Run from backend/:  python -m benchmarks.bench_login_storm --logins 64 --seconds 5
+
+Three phases against the ASGI app in one event loop: no storm, a storm
+hashed on the shared threadpool (HASH_EXECUTOR=shared, the old behaviour)
+and a storm on the dedicated bounded hasher. With the dedicated hasher the
+probe's p50/p99 should stay close to the no-storm numbers.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.seed import reset_schema
+from app import passwords
+from app.main import app
+
+
+async def probe(client, headers, until):
+    samples = []
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        response = await client.get("/creatives/", headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+        await asyncio.sleep(0.01)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))]
+
+
+async def login_loop(client, until, counts):
+    form = {"username": "storm", "password": "storm-password"}
+    while time.perf_counter() < until:
+        status = (await client.post("/auth/login", data=form)).status_code
+        counts[status] = counts.get(status, 0) + 1
+
+
+async def phase(client, headers, seconds, logins):
+    until = time.perf_counter() + seconds
+    counts = {}
+    storm = [asyncio.create_task(login_loop(client, until, counts)) for _ in range(logins)]
+    p50, p99 = await probe(client, headers, until)
+    await asyncio.gather(*storm)
+    return p50, p99, counts
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        passwords.configure(rounds=args.rounds)
+        for username, password in (("storm", "storm-password"), ("probe", "probe-password")):
+            await client.post("/auth/register", json={"username": username, "password": password})
+        token = (await client.post("/auth/login", data={"username": "probe", "password": "probe-password"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await client.get("/creatives/", headers=headers)  # warm the user cache
+
+        print(f"GET /creatives/ latency, {args.logins} concurrent logins, bcrypt rounds {args.rounds}")
+        for label, logins, mode in (("no storm", 0, "thread"), ("storm, shared threadpool", args.logins, "shared"),
+                                    ("storm, dedicated hasher", args.logins, "thread")):
+            hasher = passwords.configure(rounds=args.rounds, mode=mode, workers=args.workers)
+            p50, p99, counts = await phase(client, headers, args.seconds, logins)
+            print(f"  {label:26} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  logins {counts or '-'}  hasher {mode}/{hasher.workers}")
+        passwords.hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login loops")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    reset_schema()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the aggregated metrics query with the old per-variant loop.
+
+Run from backend/:  python -m benchmarks.bench_metrics --variants 40 --rows 2000
+"""
+import argparse
+import time
+
+from benchmarks.seed import seed
+from app import crud
+from app.db import SessionLocal
+from app.models import Creative, Performance
+
+
+def legacy_calculate_metrics(product_id, db, user_id):
+    variants = db.query(Creative).filter(Creative.product_id == product_id, Creative.user_id == user_id).all()
+    result = []
+    for variant in variants:
+        performances = db.query(Performance).filter(Performance.variant_id == variant.id, Performance.user_id == user_id).all()
+        impressions = sum(p.impressions for p in performances)
+        clicks = sum(p.clicks for p in performances)
+        conversions = sum(p.conversions for p in performances)
+        ctr = clicks / impressions if impressions else 0
+        cvr = conversions / clicks if clicks else 0
+        imp_to_conv = conversions / impressions if impressions else 0
+        result.append({
+            "variant_id": variant.id,
+            "ctr": round(ctr, 4),
+            "cvr": round(cvr, 4),
+            "impression_to_conversion": round(imp_to_conv, 4),
+        })
+    return result
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=2000, help="performance rows per variant")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ids = seed(variants=args.variants, rows_per_variant=args.rows)
+    product_id, user_id = ids["product_ids"][0], ids["user_id"]
+    db = SessionLocal()
+    try:
+        legacy_t, legacy = timeit(lambda: legacy_calculate_metrics(product_id, db, user_id), args.repeat)
+        db.expunge_all()
+        new_t, new = timeit(lambda: crud.calculate_metrics(product_id, db, user_id), args.repeat)
+    finally:
+        db.close()
+    assert sorted(legacy, key=lambda r: r["variant_id"]) == new, "aggregated metrics differ from the per-variant loop"
+    print(f"variants={args.variants} rows={args.variants * args.rows}")
+    print(f"per-variant loop : {legacy_t * 1000:9.2f} ms")
+    print(f"single aggregate : {new_t * 1000:9.2f} ms  ({legacy_t / new_t:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Best creative across all products: per-product calculate_metrics vs the analytics snapshot.
+
+Run from backend/:  python -m benchmarks.bench_reports --products 20 --variants 10
+
+The baseline is what a client does today (one calculate_metrics call per
+product, then a sort); the snapshot is loaded once, then every ranking runs
+in memory. Incremental refresh is timed after a batch of new rows.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from benchmarks.seed import seed
+from app import analytics, crud, models
+from app.db import SessionLocal
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--variants", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=200, help="performance rows per variant")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ids = seed(products=args.products, variants=args.variants, rows_per_variant=args.rows)
+    user_id = ids["user_id"]
+    db = SessionLocal()
+    try:
+        def per_product():
+            rows = []
+            for product_id in ids["product_ids"]:
+                rows.extend(crud.calculate_metrics(product_id, db, user_id))
+            return sorted(rows, key=lambda r: r["ctr"], reverse=True)[:10]
+
+        baseline_ms, baseline = timed(per_product, args.repeat)
+        load_ms, snapshot = timed(lambda: analytics.load(db, user_id), 1)
+        rank_ms, ranked = timed(lambda: snapshot.rank("ctr", limit=10), args.repeat)
+        assert [r["variant_id"] for r in baseline] == [r["creative_id"] for r in ranked]
+
+        test_id = ids["test_ids"][0]
+        variant_id = snapshot.columns.row_creative[snapshot.columns.row_test == test_id][0]
+        db.execute(insert(models.Performance), [
+            {"test_id": test_id, "variant_id": int(variant_id), "impressions": 10, "clicks": 1, "conversions": 0,
+             "timestamp": datetime(2024, 3, 1), "user_id": user_id}
+            for _ in range(1000)
+        ])
+        db.commit()
+        refresh_ms, _ = timed(lambda: snapshot.refresh(db), 1)
+    finally:
+        db.close()
+
+    print(f"products={args.products} variants={args.variants} rows={args.products * args.variants * args.rows}")
+    print(f"calculate_metrics per product : {baseline_ms:9.2f} ms per ranking")
+    print(f"snapshot cold load            : {load_ms:9.2f} ms (once)")
+    print(f"snapshot rank                 : {rank_ms:9.3f} ms per ranking  ({baseline_ms / rank_ms:.0f}x)")
+    print(f"incremental refresh (+1000)   : {refresh_ms:9.2f} ms")
+    print(f"snapshot                      : {snapshot.describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Cold-start time of a worker: import, lifespan startup and first requests.
+
+Run from backend/:  python -m benchmarks.bench_startup --runs 5
+
+Each run is a fresh interpreter, as a new uvicorn worker would be. The
+configurations compare auto-migrating at startup with the separate
+`python -m app.migrations` step, and show that an unreachable Postgres URL
+does not delay startup because the engine connects on first use.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+t1 = time.perf_counter()
+client = TestClient(app)
+client.__enter__()
+t2 = time.perf_counter()
+client.get("/health")
+t3 = time.perf_counter()
+ok = None
+if __import__("os").environ.get("FIRST_DB_REQUEST"):
+    ok = client.post("/auth/login", data={"username": "nobody", "password": "x"}).status_code
+t4 = time.perf_counter()
+client.__exit__(None, None, None)
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "lifespan_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "first_db_request_ms": (t4 - t3) * 1000 if ok else None}))
+"""
+
+CONFIGS = {
+    "sqlite, auto-migrate (fresh file)": {"DATABASE_URL": "sqlite:///./startup.db", "DB_AUTO_MIGRATE": "true",
+                                          "FIRST_DB_REQUEST": "1", "_fresh": "1"},
+    "sqlite, migrated beforehand": {"DATABASE_URL": "sqlite:///./startup.db", "DB_AUTO_MIGRATE": "false",
+                                    "FIRST_DB_REQUEST": "1"},
+    "postgres unreachable, no auto-migrate": {"DATABASE_URL": "postgresql://user:pw@127.0.0.1:1/none",
+                                              "DB_AUTO_MIGRATE": "false"},
+}
+
+
+def run_once(env):
+    if env.pop("_fresh", None) and os.path.exists("startup.db"):
+        os.remove("startup.db")
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    subprocess.run([sys.executable, "-m", "app.migrations"], env=dict(os.environ, DATABASE_URL="sqlite:///./startup.db"),
+                   capture_output=True, check=True)
+    for label, config in CONFIGS.items():
+        runs = [run_once(dict(os.environ, SECRET_KEY=os.environ.get("SECRET_KEY", "bench-secret"), **config))
+                for _ in range(args.runs)]
+        if "_fresh" in config:  # leave a migrated file for the next configuration
+            subprocess.run([sys.executable, "-m", "app.migrations"], env=dict(os.environ, DATABASE_URL="sqlite:///./startup.db"),
+                           capture_output=True, check=True)
+        medians = {key: statistics.median(r[key] for r in runs) for key in runs[0] if runs[0][key] is not None}
+        print(f"{label:40} " + "  ".join(f"{key} {value:7.1f}" for key, value in medians.items()))
+    os.remove("startup.db")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Time stats.analyze for tests with many variants.
+
+Run from backend/:  python -m benchmarks.bench_stats --variants 10 50 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app import stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=int, nargs="+", default=[2, 10, 50, 100])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    for k in args.variants:
+        clicks = rng.integers(500, 50_000, k)
+        conversions = rng.binomial(clicks, rng.uniform(0.02, 0.06, k))
+        stats.analyze(conversions, clicks)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = stats.analyze(conversions, clicks)
+        per_call = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"variants={k:4}  {per_call:7.3f} ms/call  leader={result['leader']} "
+              f"confidence={result['confidence']:.3f} conclusive={result['conclusive']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Acknowledgement latency of POST /performance/ vs the buffered POST /performance/events.
+
+Run from backend/:  python -m benchmarks.bench_write_buffer --requests 2000
+
+The client is entered as a context manager so the lifespan starts the
+write-buffer worker; the run ends by draining it and reporting flush lag.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.client import authed_client
+from benchmarks.seed import reset_schema
+from app import write_buffer
+
+
+def latencies(client, path, body, headers, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.post(path, json=body, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code in (200, 202), response.text
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (n - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    reset_schema()
+    client, headers = authed_client()
+    with client:
+        product = client.post("/products/", json={"title": "p", "description": "d", "images": ["a.png"]}, headers=headers).json()
+        creative = client.post("/creatives/", json={
+            "product_id": product["id"], "image_url": "i", "headline": "h", "description": "d",
+        }, headers=headers).json()
+        test = client.post("/tests/", json={"product_id": product["id"], "variant_ids": [creative["id"]]}, headers=headers).json()
+        event = {"test_id": test["id"], "variant_id": creative["id"], "impressions": 1, "clicks": 0, "conversions": 0}
+
+        for path in ("/performance/", "/performance/events"):
+            p50, p99 = latencies(client, path, event, headers, args.requests)
+            print(f"POST {path:20} p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+        start = time.perf_counter()
+    print(f"drain on shutdown   : {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"write buffer stats  : {write_buffer.buffer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def authed_client(username="bench-http", password="bench-password"):
+    """TestClient for the app plus Authorization headers for a fresh user."""
+    client = TestClient(app)
+    client.post("/auth/register", json={"username": username, "password": password})
+    token = client.post("/auth/login", data={"username": username, "password": password}).json()["access_token"]
+    return client, {"Authorization": f"Bearer {token}"}
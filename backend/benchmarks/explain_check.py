@@ -0,0 +1,98 @@
+"""Fail if any hot crud query is planned as a full-table scan.
+
+Run from backend/:  python -m benchmarks.explain_check
+
+Every statement each crud read issues is captured and re-run under EXPLAIN.
+On SQLite a plain "SCAN <table>" step is a failure; on Postgres the check
+runs with enable_seqscan=off, so a remaining "Seq Scan" means no usable index.
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from benchmarks.seed import seed
+from app import crud
+from app.db import SessionLocal
+
+
+@contextmanager
+def captured_statements(bind):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", record)
+
+
+def full_scans(dialect, dbapi_conn, statement, parameters):
+    cursor = dbapi_conn.cursor()
+    try:
+        if dialect == "postgresql":
+            cursor.execute("SET enable_seqscan = off")
+            cursor.execute("EXPLAIN " + statement, parameters)
+            plan = [row[0] for row in cursor.fetchall()]
+            return [line.strip() for line in plan if "Seq Scan" in line]
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        plan = [row[-1] for row in cursor.fetchall()]
+        return [line for line in plan if line.startswith("SCAN ") and " USING " not in line]
+    finally:
+        cursor.close()
+
+
+def main():
+    ids = seed(products=3, variants=10, rows_per_variant=50)
+    user_id, product_id, test_id = ids["user_id"], ids["product_ids"][0], ids["test_ids"][0]
+    db = SessionLocal()
+    creative_id = crud.get_creatives_by_product(db, product_id, user_id)[0].id
+    checks = {
+        "get_user_by_username": lambda: crud.get_user_by_username(db, "bench"),
+        "get_product": lambda: crud.get_product(db, product_id, user_id),
+        "get_products": lambda: crud.get_products(db, user_id),
+        "get_creatives": lambda: crud.get_creatives(db, user_id),
+        "get_creatives_by_product": lambda: crud.get_creatives_by_product(db, product_id, user_id),
+        "get_abtests": lambda: crud.get_abtests(db, user_id),
+        "get_abtest_by_id": lambda: crud.get_abtest_by_id(db, test_id, user_id),
+        "get_abtests_by_creative": lambda: crud.get_abtests_by_creative(db, creative_id, user_id),
+        "get_performance_by_test": lambda: crud.get_performance_by_test(db, test_id, user_id),
+        "get_performance_by_test[page]": lambda: crud.get_performance_by_test(
+            db, test_id, user_id, limit=100, after=50, fields=["id", "clicks"]
+        ),
+        "get_creatives[page]": lambda: crud.get_creatives(db, user_id, limit=5, after=3),
+        "calculate_metrics": lambda: crud.calculate_metrics(product_id, db, user_id),
+        "calculate_metrics[raw window]": lambda: crud.calculate_metrics(
+            product_id, db, user_id, start=datetime(2024, 1, 1, 0, 30)
+        ),
+        "suggest_best_creative": lambda: crud.suggest_best_creative(db, test_id, user_id),
+        "get_timeseries": lambda: crud.get_timeseries(db, test_id, user_id, bucket="week", max_points=1000),
+        "get_timeseries[raw window]": lambda: crud.get_timeseries(
+            db, test_id, user_id, bucket="hour", start=datetime(2024, 1, 1, 0, 30)
+        ),
+    }
+    failures = 0
+    try:
+        for name, call in checks.items():
+            db.expire_all()
+            with captured_statements(db.get_bind()) as statements:
+                call()
+            dbapi_conn = db.connection().connection
+            scans = [scan for statement, params in statements for scan in full_scans(db.get_bind().dialect.name, dbapi_conn, statement, params)]
+            status = "FAIL" if scans else "ok"
+            print(f"{status:4} {name} ({len(statements)} statements)")
+            for scan in scans:
+                print(f"       {scan}")
+            failures += bool(scans)
+    finally:
+        db.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Latency under concurrent clients for the sync and the asyncio database path.
+
+Run from backend/:  python -m benchmarks.load_async --clients 50 --requests 20
+
+Each mode runs in its own process (DB_ASYNC is read at import time) against
+the app in-process through httpx's ASGI transport. Point DATABASE_URL at
+Postgres for numbers that reflect network waits; SQLite is the default.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROUTES = ("/creatives/", "/tests/", "/performance/metrics?product_id={product_id}")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run_child(clients, requests):
+    from benchmarks.seed import reset_schema
+    import httpx
+    from app import limits
+    from app.main import app
+
+    reset_schema()
+    limits.limiter.enabled = False  # one user drives all clients; see bench_limits for admission control
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/auth/register", json={"username": "load", "password": "load-password"})
+        token = (await client.post("/auth/login", data={"username": "load", "password": "load-password"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        product = (await client.post("/products/", json={"title": "p", "description": "d", "images": ["a"]}, headers=headers)).json()
+        variant_ids = []
+        for _ in range(10):
+            creative = (await client.post("/creatives/", json={
+                "product_id": product["id"], "image_url": "i", "headline": "h", "description": "d",
+            }, headers=headers)).json()
+            variant_ids.append(creative["id"])
+        test = (await client.post("/tests/", json={"product_id": product["id"], "variant_ids": variant_ids}, headers=headers)).json()
+        for _ in range(20):
+            await client.post(f"/performance/simulate/{test['id']}", headers=headers)
+
+        routes = [r.format(product_id=product["id"]) for r in ROUTES]
+        latencies = []
+
+        async def worker(i):
+            for n in range(requests):
+                start = time.perf_counter()
+                response = await client.get(routes[(i + n) % len(routes)], headers=headers)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_child(args.clients, args.requests))))
+        return
+
+    for mode in ("sync", "async"):
+        env = dict(os.environ, DB_ASYNC="true" if mode == "async" else "false")
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.load_async", "--child",
+             "--clients", str(args.clients), "--requests", str(args.requests)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(out)
+        print(f"{mode:5}  {result['requests']} req  {result['rps']:8.1f} req/s  "
+              f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark every crud hot path and the main HTTP routes at several data sizes.
+
+Run from backend/:
+    python -m benchmarks.run --sizes small medium --output bench-results.json
+    python -m benchmarks.run --sizes small --compare bench-results.json
+
+Each size seeds a fresh database (SQLite by default, DATABASE_URL to
+override) with app.simulator, then times read paths first and write paths
+last so ingestion does not change what the reads see. Results are written
+as JSON: one entry per size and operation with min/median/mean/p95 in ms.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+import sqlalchemy
+
+from benchmarks.client import authed_client
+from benchmarks.seed import reset_schema
+from app import crud, limits, response_cache, schemas, simulator
+from app.db import SessionLocal, get_engine
+
+SIZES = {
+    "small": dict(users=1, products=2, creatives=10, tests=1, hours=24 * 7),
+    "medium": dict(users=2, products=5, creatives=20, tests=1, hours=24 * 30),
+    "large": dict(users=2, products=10, creatives=50, tests=1, hours=24 * 90),
+}
+
+
+def measure(fn, repeat):
+    fn()  # warm-up: first call pays for statement compilation and caches
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p95_ms": round(samples[min(repeat - 1, int(0.95 * repeat))], 3),
+    }
+
+
+def run_size(name, shape, repeat):
+    reset_schema()
+    db = SessionLocal()
+    started = time.perf_counter()
+    summary = simulator.seed_database(db, password="bench-password", **shape)
+    seed_seconds = time.perf_counter() - started
+    user = summary["users"][0]
+    user_id = user["id"]
+    products = crud.get_products(db, user_id)
+    product_id = products[0].id
+    tests = crud.get_abtests(db, user_id)
+    test = tests[0]
+    variant_id = test["variant_ids"][0]
+    results = {}
+
+    def bench(op, fn, n=repeat):
+        db.expire_all()
+        results[op] = measure(fn, n)
+        print(f"  {op:42} median {results[op]['median_ms']:9.3f} ms  p95 {results[op]['p95_ms']:9.3f} ms")
+
+    print(f"[{name}] seeded {summary['rows']} rows in {seed_seconds:.1f}s")
+    bench("crud.calculate_metrics", lambda: crud.calculate_metrics(product_id, db, user_id))
+    bench("crud.calculate_metrics[test window]", lambda: crud.calculate_metrics(
+        product_id, db, user_id, test_id=test["id"], start=datetime(2000, 1, 1)))
+    bench("crud.suggest_best_creative", lambda: crud.suggest_best_creative(db, test["id"], user_id))
+    bench("crud.get_abtests", lambda: crud.get_abtests(db, user_id))
+    bench("crud.get_products", lambda: crud.get_products(db, user_id))
+    bench("crud.get_creatives", lambda: crud.get_creatives(db, user_id))
+    bench("crud.get_performance_by_test[page 500]", lambda: crud.get_performance_by_test(db, test["id"], user_id, limit=501))
+    bench("crud.get_performance_by_test[all]", lambda: crud.get_performance_by_test(db, test["id"], user_id), n=max(3, repeat // 10))
+
+    client, headers = authed_client(user["username"], "bench-password")
+    limits.limiter.enabled = False  # measuring endpoint cost, not admission control
+    cache_backend = response_cache.backend
+    response_cache.configure(response_cache.LocalBackend(0, 0))  # uncached numbers first
+    bench("http GET /creatives/", lambda: client.get("/creatives/", headers=headers))
+    bench("http GET /tests/", lambda: client.get("/tests/", headers=headers))
+    bench("http GET /performance/metrics", lambda: client.get(f"/performance/metrics?product_id={product_id}", headers=headers))
+    bench("http GET /performance/suggest/{id}", lambda: client.get(f"/performance/suggest/{test['id']}", headers=headers))
+    response_cache.configure(cache_backend)
+    bench("http GET /performance/metrics[cached]", lambda: client.get(f"/performance/metrics?product_id={product_id}", headers=headers))
+    bench("http GET /performance/suggest/{id}[cached]", lambda: client.get(f"/performance/suggest/{test['id']}", headers=headers))
+    bench("http GET /performance/test/{id}[page 500]", lambda: client.get(f"/performance/test/{test['id']}?limit=500", headers=headers))
+
+    perf = schemas.PerformanceCreate(test_id=test["id"], variant_id=variant_id, impressions=100, clicks=5, conversions=1)
+    batch = [perf] * 1000
+    bench("crud.log_performance", lambda: crud.log_performance(db, perf, user_id))
+    bench("crud.bulk_log_performance[1000 rows]", lambda: crud.bulk_log_performance(db, batch, user_id), n=max(3, repeat // 10))
+    creatives = [schemas.CreativeCreate(product_id=product_id, image_url="i", headline="h", description="d")] * 1000
+    bench("crud.create_creative", lambda: crud.create_creative(db, creatives[0], user_id))
+    bench("crud.create_creatives[1000 rows]", lambda: crud.create_creatives(db, creatives, user_id), n=max(3, repeat // 10))
+    body = json.dumps([perf.dict(exclude_none=True)] * 1000)
+    bench("http POST /performance/", lambda: client.post("/performance/", json=perf.dict(exclude_none=True), headers=headers))
+    bench("http POST /performance/bulk[1000 rows]", lambda: client.post(
+        "/performance/bulk", content=body, headers={**headers, "Content-Type": "application/json"}), n=max(3, repeat // 10))
+    db.close()
+    return {"shape": shape, "rows": summary["rows"], "seed_seconds": round(seed_seconds, 3), "operations": results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nmedian vs {baseline_path} ({baseline['meta'].get('git_revision')})")
+    for size, result in current["sizes"].items():
+        old = baseline["sizes"].get(size, {}).get("operations", {})
+        for op, stats in result["operations"].items():
+            if op in old and old[op]["median_ms"]:
+                ratio = stats["median_ms"] / old[op]["median_ms"]
+                print(f"  [{size}] {op:42} {ratio:6.2f}x {'slower' if ratio > 1 else 'faster'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["small"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare medians against")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "database": get_engine().dialect.name,
+            "repeat": args.repeat,
+        },
+        "sizes": {},
+    }
+    for size in args.sizes:
+        report["sizes"][size] = run_size(size, SIZES[size], args.repeat)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Wrote {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import models, rollup
+from app.db import Base, SessionLocal, get_engine
+
+
+def reset_schema():
+    Base.metadata.drop_all(bind=get_engine())
+    Base.metadata.create_all(bind=get_engine())
+
+
+def seed(products=1, variants=20, tests=1, rows_per_variant=1000, seed_value=42, batch=10000):
+    """Seed one user with products, creatives, tests and performance rows.
+
+    Returns a dict with the ids the benchmarks need."""
+    rnd = random.Random(seed_value)
+    reset_schema()
+    db = SessionLocal()
+    try:
+        user = models.User(username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        product_ids, test_ids = [], []
+        for _ in range(products):
+            product = models.Product(title="p", description="d", images="a.png", user_id=user.id)
+            db.add(product)
+            db.flush()
+            creatives = [
+                models.Creative(product_id=product.id, image_url="i", headline="h", description="d", user_id=user.id)
+                for _ in range(variants)
+            ]
+            db.add_all(creatives)
+            db.flush()
+            variant_ids = [c.id for c in creatives]
+            for _ in range(tests):
+                test = models.ABTest(product_id=product.id, user_id=user.id)
+                test.variants = [models.ABTestVariant(creative_id=vid, position=i) for i, vid in enumerate(variant_ids)]
+                db.add(test)
+                db.flush()
+                test_ids.append(test.id)
+                start = datetime(2024, 1, 1)
+                pending = []
+                for vid in variant_ids:
+                    for i in range(rows_per_variant):
+                        impressions = rnd.randint(100, 1000)
+                        clicks = rnd.randint(0, impressions // 10)
+                        pending.append({
+                            "test_id": test.id,
+                            "variant_id": vid,
+                            "impressions": impressions,
+                            "clicks": clicks,
+                            "conversions": rnd.randint(0, clicks),
+                            "timestamp": start + timedelta(hours=i),
+                            "user_id": user.id,
+                        })
+                        if len(pending) >= batch:
+                            db.execute(insert(models.Performance), pending)
+                            rollup.apply(db, pending)
+                            pending = []
+                if pending:
+                    db.execute(insert(models.Performance), pending)
+                    rollup.apply(db, pending)
+            product_ids.append(product.id)
+        db.commit()
+        return {"user_id": user.id, "product_ids": product_ids, "test_ids": test_ids}
+    finally:
+        db.close()
@@ -12,16 +12,47 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
-// Global response interceptor for 401 Unauthorized
+const MAX_RETRIES = 3;
+const MAX_RETRY_DELAY_MS = 10000;
+
+// Global response interceptor for 401 Unauthorized; 429/503 from admission
+// control are retried after Retry-After, so fan-out pages (one request per
+// product) load in full instead of failing.
 api.interceptors.response.use(
   response => response,
-  error => {
+  async error => {
     if (error.response && error.response.status === 401) {
       localStorage.removeItem('token');
       window.location.href = '/login';
     }
+    const config = error.config;
+    const retryAfter = error.response && Number(error.response.headers['retry-after']);
+    if (config && [429, 503].includes(error.response?.status) && retryAfter && (config.retries || 0) < MAX_RETRIES) {
+      config.retries = (config.retries || 0) + 1;
+      await new Promise(resolve => setTimeout(resolve, Math.min(retryAfter * 1000, MAX_RETRY_DELAY_MS)));
+      return api(config);
+    }
     return Promise.reject(error);
   }
 );
 
+// List routes return one page per call; X-Next-Cursor carries the cursor for
+// the next one.
+export async function fetchPage(url, after = null) {
+  const res = await api.get(url, { params: after ? { after } : {} });
+  return { items: res.data, next: res.headers['x-next-cursor'] || null };
+}
+
+// Every row of a list route, following cursors page by page.
+export async function fetchAll(url) {
+  let items = [];
+  let after = null;
+  do {
+    const page = await fetchPage(url, after);
+    items = items.concat(page.items);
+    after = page.next;
+  } while (after);
+  return items;
+}
+
 export default api; 
\ No newline at end of file
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Typography, Button, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Alert, MenuItem, Select, InputLabel, FormControl, Dialog, DialogTitle, DialogContent, DialogActions, Chip } from '@mui/material';
-import api from '../api/axios';
+import api, { fetchAll } from '../api/axios';
 
 export default function ABTests() {
   const [abtests, setABTests] = useState([]);
@@ -15,8 +15,7 @@ export default function ABTests() {
 
   const fetchABTests = async () => {
     try {
-      const res = await api.get('/tests/');
-      setABTests(res.data);
+      setABTests(await fetchAll('/tests/'));
     } catch (err) {
       setError('Failed to fetch AB tests');
     }
@@ -24,8 +23,7 @@ export default function ABTests() {
 
   const fetchProducts = async () => {
     try {
-      const res = await api.get('/products/');
-      setProducts(res.data);
+      setProducts(await fetchAll('/products/'));
     } catch (err) {
       setError('Failed to fetch products');
     }
@@ -33,8 +31,7 @@ export default function ABTests() {
 
   const fetchCreatives = async () => {
     try {
-      const res = await api.get('/creatives/');
-      setCreatives(res.data);
+      setCreatives(await fetchAll('/creatives/'));
     } catch (err) {
       setError('Failed to fetch creatives');
     }
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Typography, TextField, Button, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Alert, MenuItem, Select, InputLabel, FormControl } from '@mui/material';
 import DeleteIcon from '@mui/icons-material/Delete';
-import api from '../api/axios';
+import api, { fetchAll } from '../api/axios';
 
 export default function Creatives() {
   const [creatives, setCreatives] = useState([]);
@@ -14,8 +14,7 @@ export default function Creatives() {
 
   const fetchCreatives = async () => {
     try {
-      const res = await api.get('/creatives/');
-      setCreatives(res.data);
+      setCreatives(await fetchAll('/creatives/'));
     } catch (err) {
       setError('Failed to fetch creatives');
     }
@@ -23,8 +22,7 @@ export default function Creatives() {
 
   const fetchProducts = async () => {
     try {
-      const res = await api.get('/products/');
-      setProducts(res.data);
+      setProducts(await fetchAll('/products/'));
     } catch (err) {
       setError('Failed to fetch products');
     }
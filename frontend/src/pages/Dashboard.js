@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Typography, Paper, Grid, Alert } from '@mui/material';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, Legend, ResponsiveContainer } from 'recharts';
-import api from '../api/axios';
+import api, { fetchAll } from '../api/axios';
 
 export default function Dashboard() {
   const [metrics, setMetrics] = useState([]);
@@ -10,10 +10,10 @@ export default function Dashboard() {
 
   const fetchAllMetrics = async () => {
     try {
-      const productsRes = await api.get('/products/');
+      const products = await fetchAll('/products/');
       let allMetrics = [];
       let totalImpressions = 0, totalClicks = 0, totalConversions = 0;
-      for (const product of productsRes.data) {
+      for (const product of products) {
         const metricsRes = await api.get(`/performance/metrics?product_id=${product.id}`);
         allMetrics = allMetrics.concat(metricsRes.data.map(m => ({ ...m, product: product.title })));
         metricsRes.data.forEach(m => {
@@ -1,28 +1,30 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Typography, Button, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, Alert, MenuItem, Select, InputLabel, FormControl } from '@mui/material';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, Legend, ResponsiveContainer } from 'recharts';
-import api from '../api/axios';
+import api, { fetchAll, fetchPage } from '../api/axios';
 
 export default function Performance() {
   const [tests, setTests] = useState([]);
   const [selectedTest, setSelectedTest] = useState('');
   const [performance, setPerformance] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [metrics, setMetrics] = useState([]);
   const [error, setError] = useState(null);
 
   const fetchTests = async () => {
     try {
-      const res = await api.get('/tests/');
-      setTests(res.data);
+      setTests(await fetchAll('/tests/'));
     } catch (err) {
       setError('Failed to fetch tests');
     }
   };
 
-  const fetchPerformance = async (testId) => {
+  // One page at a time; "Load more" follows the cursor.
+  const fetchPerformance = async (testId, after = null) => {
     try {
-      const res = await api.get(`/performance/test/${testId}`);
-      setPerformance(res.data);
+      const page = await fetchPage(`/performance/test/${testId}`, after);
+      setPerformance(prev => (after ? prev.concat(page.items) : page.items));
+      setNextCursor(page.next);
     } catch (err) {
       setError('Failed to fetch performance');
     }
@@ -102,6 +104,9 @@ export default function Performance() {
             </TableBody>
           </Table>
         </TableContainer>
+        {nextCursor && (
+          <Button sx={{ mb: 4 }} onClick={() => fetchPerformance(selectedTest, nextCursor)}>Load more</Button>
+        )}
         <Typography variant="h6">Metrics</Typography>
         <ResponsiveContainer width="100%" height={300}>
           <BarChart data={metrics} margin={{ top: 20, right: 30, left: 0, bottom: 5 }}>
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Typography, TextField, Button, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Alert } from '@mui/material';
 import DeleteIcon from '@mui/icons-material/Delete';
-import api from '../api/axios';
+import api, { fetchAll } from '../api/axios';
 
 export default function Products() {
   const [products, setProducts] = useState([]);
@@ -12,8 +12,7 @@ export default function Products() {
 
   const fetchProducts = async () => {
     try {
-      const res = await api.get('/products/');
-      setProducts(res.data);
+      setProducts(await fetchAll('/products/'));
     } catch (err) {
       setError('Failed to fetch products');
     }